@@ -0,0 +1,574 @@
+# Benchmark HTTP reproducible de la API.
+#
+#   pipenv run bench seed --scale 100k
+#   pipenv run bench run --driver client --output antes.json
+#   pipenv run bench run --driver gunicorn --scale 100k --workers 4 --concurrency 8 --output antes.json
+#   pipenv run bench compare antes.json despues.json
+#
+# seed crea el esquema con las migraciones y lo llena con datos sinteticos
+# deterministas (1k, 100k, 1m o un numero). run recorre todas las rutas de
+# app.py (/spec solo si APP_COMPONENTS incluye swagger, como el valor por
+# defecto full) con el test client de Flask o contra un gunicorn local y escribe
+# p50/p95/p99, throughput, bytes enviados, CPU por peticion y RSS maximo en
+# JSON. compare marca las rutas que empeoran mas de un umbral entre dos
+# ejecuciones. Para ver el coste de la compresion:
+#   pipenv run bench run --encoding identity --output plano.json
+#   pipenv run bench run --encoding gzip --output gzip.json
+#   pipenv run bench compare plano.json gzip.json --verbose
+# y para comparar los perfiles de config/gunicorn_profiles.py (sync, gthread, async):
+#   pipenv run bench run --driver gunicorn --profile gthread --output gthread.json
+#
+# Los listados piden una pagina distinta en cada peticion (?after=), asi que
+# el cache de respuestas casi nunca acierta. Con --cache off se desactivan el
+# cache de respuestas y el de entidades y todas las lecturas van a la base:
+#   pipenv run bench run --cache off --output sin-cache.json
+#
+# Por defecto usa sqlite:////tmp/bench.db y nunca DATABASE_URL, para no
+# vaciar por accidente la base de desarrollo.
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+GUNICORN_CONFIG = os.path.join(ROOT, 'config', 'gunicorn_profiles.py')
+MIGRATIONS = os.path.join(ROOT, 'migrations')
+DEFAULT_DATABASE_URL = 'sqlite:////tmp/bench.db'
+
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+CHUNK_SIZE = 10000
+FAVORITES_PER_KIND = 5
+BATCH_FAVORITES = 5
+
+HAIR = ['black', 'brown', 'blond', 'white', 'none', 'auburn']
+EYES = ['blue', 'brown', 'yellow', 'red', 'black', 'unknown']
+GENDERS = ['male', 'female', 'n/a', 'hermaphrodite']
+CLIMATES = ['arid', 'temperate', 'tropical', 'frozen', 'murky']
+TERRAINS = ['desert', 'grasslands', 'mountains', 'jungle', 'ocean', 'swamp']
+CLASSES = ['wheeled', 'repulsorcraft', 'starfighter', 'walker', 'speeder']
+MAKERS = ['Corellia Mining Corporation', 'Incom Corporation', 'Kuat Drive Yards', 'Sienar Fleet Systems']
+
+
+def parse_scale(value):
+    value = value.lower()
+    return SCALES[value] if value in SCALES else int(value)
+
+
+def cache_env(cache):
+    # Variables de entorno de la app para --cache off
+    if cache == 'off':
+        return {'RESPONSE_CACHE_BACKEND': 'none', 'ENTITY_CACHE_SIZE': '0'}
+    return {}
+
+
+def load_app(database_url):
+    # create_app lee DATABASE_URL del entorno
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, SRC)
+    from app import create_app
+    return create_app()
+
+
+def swagger_enabled():
+    # /spec solo existe con el componente swagger (APP_COMPONENTS=full, el
+    # valor por defecto); los dos drivers heredan APP_COMPONENTS del entorno
+    sys.path.insert(0, SRC)
+    from app import parse_components
+    return 'swagger' in parse_components(os.getenv('APP_COMPONENTS', 'full'))
+
+
+def maybe(rng, value):
+    return 'unknown' if rng.random() < 0.05 else value
+
+
+def people_rows(rng, start, stop):
+    return [{
+        'id': i, 'name': f'Personaje {i:07d}', 'mass': maybe(rng, str(rng.randint(20, 200))),
+        'hair_color': rng.choice(HAIR), 'skin_color': 'fair', 'eye_color': rng.choice(EYES),
+        'birth_year': f'{rng.randint(1, 900)}BBY', 'gender': rng.choice(GENDERS),
+        'height': maybe(rng, str(rng.randint(60, 260))),
+    } for i in range(start, stop)]
+
+
+def planet_rows(rng, start, stop):
+    return [{
+        'id': i, 'name': f'Planeta {i:07d}', 'diameter': maybe(rng, f'{rng.randint(1000, 200000):,}'),
+        'rotation_period': str(rng.randint(10, 60)), 'orbital_period': str(rng.randint(200, 5000)),
+        'gravity': '1 standard', 'population': maybe(rng, str(rng.randint(1000, 10 ** 10))),
+        'climate': rng.choice(CLIMATES), 'terrain': rng.choice(TERRAINS), 'surface_water': str(rng.randint(0, 100)),
+    } for i in range(start, stop)]
+
+
+def vehicle_rows(rng, start, stop):
+    return [{
+        'id': i, 'name': f'Vehiculo {i:07d}', 'model': f'Modelo {i:07d}',
+        'vehicle_class': rng.choice(CLASSES), 'manufacturer': rng.choice(MAKERS),
+        'cost_in_credits': maybe(rng, str(rng.randint(1000, 500000))), 'length': str(rng.randint(2, 40)),
+        'crew': str(rng.randint(1, 10)), 'passengers': str(rng.randint(0, 30)),
+        'max_atmosphering_speed': str(rng.randint(100, 1500)), 'cargo_capacity': str(rng.randint(0, 1000)),
+        'consumables': '1 day', 'films': '[]', 'pilots': '[]',
+    } for i in range(start, stop)]
+
+
+def seed(args):
+    from flask_migrate import upgrade
+    from sqlalchemy import insert, text
+    app = load_app(args.database_url)
+    from models import db, Personajes, Planetas, Vehiculos, Usuario, Favorito
+    from search import index_rows
+    from favorites import FAVORITE_COLUMNS, reconcile_counters
+
+    scale = parse_scale(args.scale)
+    users = max(1, scale // 1000)
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+        for model in (Favorito, Usuario, Personajes, Planetas, Vehiculos):
+            db.session.execute(model.__table__.delete())
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(text('DELETE FROM catalog_search'))
+
+        started = time.perf_counter()
+        for model, build in ((Personajes, people_rows), (Planetas, planet_rows), (Vehiculos, vehicle_rows)):
+            for start in range(1, scale + 1, CHUNK_SIZE):
+                rows = build(rng, start, min(start + CHUNK_SIZE, scale + 1))
+                db.session.execute(insert(model), rows)
+                index_rows(model, rows)
+            print(f'{model.__tablename__}: {scale} filas', file=sys.stderr)
+
+        db.session.execute(insert(Usuario), [{
+            'id': u, 'nombre': f'Usuario {u}', 'apellido': 'Bench', 'email': f'usuario{u}@bench.local', 'password': 'bench',
+        } for u in range(1, users + 1)])
+        # Los favoritos usan la primera mitad de los ids; run borra entidades
+        # desde el final de la tabla, asi que nunca choca con una clave foranea.
+        half = max(1, scale // 2)
+        favorites = []
+        for u in range(1, users + 1):
+            for k in range(FAVORITES_PER_KIND):
+                entity_id = (u * FAVORITES_PER_KIND + k) % half + 1
+                favorites += [{'usuario_id': u, 'personajes_id': entity_id},
+                              {'usuario_id': u, 'planetas_id': entity_id},
+                              {'usuario_id': u, 'vehiculos_id': entity_id}]
+        db.session.execute(insert(Favorito), favorites)
+        # El insert de Core no pasa por los eventos que mantienen los contadores
+        # de favoritos; sin ellos /leaderboard saldria vacio
+        for model in FAVORITE_COLUMNS:
+            reconcile_counters(model)
+        db.session.commit()
+        print(f'usuarios: {users}, favoritos: {len(favorites)} '
+              f'({time.perf_counter() - started:.1f}s)', file=sys.stderr)
+
+
+def person_body(i, tag):
+    return {'name': f'Bench {tag} {i}', 'mass': '80', 'hair_color': 'black', 'skin_color': 'fair',
+            'eye_color': 'brown', 'birth_year': '19BBY', 'gender': 'male', 'height': '180'}
+
+
+def planet_body(i, tag):
+    return {'name': f'Bench {tag} {i}', 'diameter': '10465', 'rotation_period': '23', 'orbital_period': '304',
+            'gravity': '1 standard', 'population': '200000', 'climate': 'arid', 'terrain': 'desert',
+            'surface_water': '1'}
+
+
+def vehicle_body(i, tag):
+    return {'name': f'Bench {tag} {i}', 'model': f'Bench {tag} {i}', 'vehicle_class': 'wheeled',
+            'manufacturer': 'Corellia Mining Corporation', 'cost_in_credits': '150000', 'length': '36.8',
+            'crew': '46', 'passengers': '30', 'max_atmosphering_speed': '30', 'cargo_capacity': '50000',
+            'consumables': '2 months', 'films': [], 'pilots': []}
+
+
+def scenarios(scale, spec=False):
+    # (nombre, metodo, ruta(i), cuerpo(i, tag)). Las escrituras usan ids
+    # distintos en cada iteracion; los borrados de favoritos deshacen las
+    # altas anteriores y los de entidades van desde el final de la tabla.
+    spread = lambda i: i * 7919 % scale + 1
+    quarter = scale // 4
+    kinds = ['people', 'planets', 'vehicles']
+
+    def batch_body(action):
+        # Ids del segundo cuarto de cada tabla, que no usan las otras escrituras
+        def body(i, tag):
+            ids = [quarter + (i * BATCH_FAVORITES + k) % quarter for k in range(BATCH_FAVORITES)]
+            return {action: {kind: ids for kind in kinds}}
+        return body
+
+    routes = [
+        ('GET /', 'GET', lambda i: '/', None),
+        ('GET /user', 'GET', lambda i: '/user', None),
+        ('GET /search', 'GET', lambda i: f'/search?q={["per", "planeta", "veh"][i % 3]}', None),
+        ('GET /leaderboard/<kind>', 'GET', lambda i: f'/leaderboard/{kinds[i % 3]}', None),
+        ('GET /users', 'GET', lambda i: '/users', None),
+        ('GET /users/favorites', 'GET', lambda i: '/users/favorites', None),
+        ('GET /favorites', 'GET', lambda i: '/favorites', None),
+        ('GET /metrics', 'GET', lambda i: '/metrics', None),
+        ('GET /internal/pool', 'GET', lambda i: '/internal/pool', None),
+        ('GET /internal/entity-cache', 'GET', lambda i: '/internal/entity-cache', None),
+        ('GET /internal/replica', 'GET', lambda i: '/internal/replica', None),
+    ]
+    if spec:
+        routes.append(('GET /spec', 'GET', lambda i: '/spec', None))
+    for resource, fav, body in (('people', 'people', person_body), ('planets', 'planet', planet_body),
+                                ('vehicles', 'vehicle', vehicle_body)):
+        routes += [
+            (f'GET /{resource}', 'GET', lambda i, r=resource: f'/{r}?after={spread(i)}', None),
+            (f'GET /{resource}/<id>', 'GET', lambda i, r=resource: f'/{r}/{spread(i)}', None),
+            (f'POST /{resource}', 'POST', lambda i, r=resource: f'/{r}', body),
+            (f'POST /users/favorites/{fav}/<id>', 'POST', lambda i, f=fav: f'/users/favorites/{f}/{quarter + i}', None),
+            (f'DELETE /users/favorites/{fav}/<id>', 'DELETE', lambda i, f=fav: f'/users/favorites/{f}/{quarter + i}', None),
+        ]
+    routes += [
+        ('POST /users/favorites/batch (add)', 'POST', lambda i: '/users/favorites/batch', batch_body('add')),
+        ('POST /users/favorites/batch (remove)', 'POST', lambda i: '/users/favorites/batch', batch_body('remove')),
+    ]
+    for resource in kinds:
+        routes.append((f'DELETE /{resource}/<id>', 'DELETE', lambda i, r=resource: f'/{r}/{scale - i}', None))
+    return routes
+
+
+class ClientDriver:
+    name = 'client'
+
+    def __init__(self, args):
+        os.environ.update(cache_env(args.cache))
+        self.app = load_app(args.database_url)
+        self.headers = encoding_headers(args.encoding)
+
+    def start(self):
+        self.client = self.app.test_client()
+
+    def request(self, method, path, body):
+        # El test client no descomprime: get_data() son los bytes enviados
+        response = self.client.open(path, method=method, json=body, headers=self.headers)
+        return response.status_code, len(response.get_data())
+
+    def stop(self):
+        pass
+
+    def cpu_seconds(self):
+        # Incluye el propio cliente, que comparte proceso con la app
+        return time.process_time()
+
+    def rss(self):
+        # ru_maxrss esta en KiB en Linux
+        return {'peak_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+class GunicornDriver:
+    name = 'gunicorn'
+
+    def __init__(self, args):
+        self.args = args
+        self.port = free_port()
+        self.process = None
+        self.headers = encoding_headers(args.encoding)
+
+    def start(self):
+        # WEB_CONCURRENCY fija los workers de gunicorn y le dice a la app cuantos
+        # hay, asi que plano y perfiles usan la misma configuracion de caches
+        env = dict(os.environ, DATABASE_URL=self.args.database_url, WEB_CONCURRENCY=str(self.args.workers),
+                   **cache_env(self.args.cache))
+        if self.args.profile == 'plain':
+            # -c /dev/null: sin ningun fichero de configuracion, ni el
+            # gunicorn.conf.py que gunicorn buscaria en el directorio de trabajo
+            command = ['wsgi', '-c', os.devnull]
+        else:
+            # Perfil pedido de config/gunicorn_profiles.py; WEB_CONCURRENCY sustituye
+            # al numero de workers que el perfil calcula a partir de las CPU
+            command = ['-c', GUNICORN_CONFIG]
+            env.update(GUNICORN_PROFILE=self.args.profile)
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', *command, '--chdir', SRC, '--bind', f'127.0.0.1:{self.port}',
+             '--log-level', 'warning'],
+            env=env, cwd=ROOT,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                self.request('GET', '/', None)
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise SystemExit('gunicorn no arranco en 30s')
+
+    def request(self, method, path, body):
+        # Los workers sync de gunicorn cierran la conexion en cada respuesta
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            headers = dict(self.headers)
+            payload = None
+            if body is not None:
+                payload = json.dumps(body).encode()
+                headers['Content-Type'] = 'application/json'
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            # http.client no descomprime: son los bytes del cuerpo en la red
+            return response.status, len(response.read())
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+    def cpu_seconds(self):
+        # CPU de usuario y sistema del master y los workers de gunicorn
+        return sum(process_cpu_seconds(pid) for pid in [self.process.pid] + children(self.process.pid))
+
+    def rss(self):
+        workers = children(self.process.pid)
+        peaks = [peak_rss_kib(pid) for pid in workers]
+        return {
+            'master_peak_rss_kib': peak_rss_kib(self.process.pid),
+            'worker_peak_rss_kib': max(peaks, default=0),
+            'workers_total_peak_rss_kib': sum(peaks),
+        }
+
+
+def encoding_headers(encoding):
+    return {} if encoding == 'identity' else {'Accept-Encoding': encoding}
+
+
+def process_cpu_seconds(pid):
+    # utime y stime, campos 14 y 15 de /proc/<pid>/stat, en ticks del reloj
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except OSError:
+        return 0.0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def peak_rss_kib(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def summarize(samples, statuses, sizes, elapsed, cpu):
+    samples = sorted(samples)
+    cuts = statistics.quantiles(samples, n=100, method='inclusive') if len(samples) > 1 else samples * 99
+    return {
+        'requests': len(samples),
+        'p50_ms': round(cuts[49] * 1000, 3),
+        'p95_ms': round(cuts[94] * 1000, 3),
+        'p99_ms': round(cuts[98] * 1000, 3),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'bytes_mean': round(statistics.fmean(sizes), 1),
+        'cpu_ms_per_request': round(cpu / len(samples) * 1000, 3),
+        'status': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+
+def run_scenario(driver, method, path, body, count, offset, concurrency, tag):
+    samples = []
+    statuses = []
+    sizes = []
+    lock = threading.Lock()
+
+    def one(i):
+        started = time.perf_counter()
+        status, size = driver.request(method, path(i), body(i, tag) if body else None)
+        elapsed = time.perf_counter() - started
+        with lock:
+            samples.append(elapsed)
+            statuses.append(status)
+            sizes.append(size)
+
+    started = time.perf_counter()
+    cpu = driver.cpu_seconds()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(offset, offset + count)))
+    else:
+        for i in range(offset, offset + count):
+            one(i)
+    return samples, statuses, sizes, time.perf_counter() - started, driver.cpu_seconds() - cpu
+
+
+def count_rows(database_url):
+    from sqlalchemy import create_engine, text
+    engine = create_engine(database_url)
+    with engine.connect() as connection:
+        return {table: connection.execute(text(f'SELECT count(*) FROM {table}')).scalar()
+                for table in ('personajes', 'planetas', 'vehiculos', 'usuario', 'favorito')}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    if args.scale:
+        # En otro proceso, para que la carga no cuente en el RSS del benchmark
+        subprocess.run([sys.executable, __file__, 'seed', '--scale', args.scale, '--seed', str(args.seed),
+                        '--database-url', args.database_url], check=True)
+    rows = count_rows(args.database_url)
+    scale = rows['personajes']
+    if scale < 4 * (args.warmup + args.requests):
+        raise SystemExit(f'La base tiene {scale} personajes; ejecuta antes "bench seed" con mas escala '
+                         f'o reduce --requests')
+
+    driver = (GunicornDriver if args.driver == 'gunicorn' else ClientDriver)(args)
+    concurrency = args.concurrency if args.driver == 'gunicorn' else 1
+    tag = str(int(time.time()))
+    results = {}
+    driver.start()
+    try:
+        for name, method, path, body in scenarios(scale, spec=swagger_enabled()):
+            if args.only and args.only not in name:
+                continue
+            run_scenario(driver, method, path, body, args.warmup, 0, concurrency, tag)
+            measured = run_scenario(driver, method, path, body, args.requests, args.warmup, concurrency, tag)
+            results[name] = summarize(*measured)
+            print(f"{name:42} p50 {results[name]['p50_ms']:9.3f} ms  p99 {results[name]['p99_ms']:9.3f} ms  "
+                  f"{results[name]['throughput_rps']} req/s  {results[name]['bytes_mean']:.0f} B  "
+                  f"{results[name]['cpu_ms_per_request']:.3f} ms CPU", file=sys.stderr)
+        memory = driver.rss()
+    finally:
+        driver.stop()
+
+    report = {
+        'meta': {
+            'driver': driver.name,
+            'workers': args.workers if args.driver == 'gunicorn' else None,
+            'profile': args.profile if args.driver == 'gunicorn' else None,
+            'concurrency': concurrency,
+            'encoding': args.encoding,
+            'cache': args.cache,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'rows': rows,
+            'database': args.database_url.split(':', 1)[0],
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        },
+        'memory': memory,
+        'routes': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+# metrica -> True si un valor mas alto es peor
+COMPARED_METRICS = {'p50_ms': True, 'p95_ms': True, 'p99_ms': True, 'throughput_rps': False,
+                    'bytes_mean': True, 'cpu_ms_per_request': True}
+
+# Metricas que no son tiempos: no les aplica --min-ms
+UNTIMED_METRICS = {'bytes_mean'}
+
+
+def compare(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    regressions = 0
+    for name in sorted(set(before['routes']) & set(after['routes'])):
+        for metric, higher_is_worse in COMPARED_METRICS.items():
+            # Las ejecuciones anteriores a bytes_mean/cpu_ms_per_request no las tienen
+            old, new = before['routes'][name].get(metric), after['routes'][name].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            worse = change > args.threshold if higher_is_worse else change < -args.threshold
+            # Diferencias de microsegundos son ruido aunque el porcentaje sea alto
+            if worse and higher_is_worse and metric not in UNTIMED_METRICS and new - old < args.min_ms:
+                worse = False
+            regressions += worse
+            if worse or args.verbose:
+                print(f"{'REGRESION' if worse else '':9} {name:42} {metric:15} {old:>10} -> {new:<10} ({change:+.1f}%)")
+
+    for name in sorted(set(before['routes']) ^ set(after['routes'])):
+        print(f'{"":9} {name:42} solo en una de las ejecuciones')
+    print(f'{regressions} regresiones (umbral {args.threshold}%)')
+    if regressions:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la API')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help='crea y llena la base de benchmark')
+    seed_parser.add_argument('--scale', default='1k', help='1k, 100k, 1m o un numero de filas por tabla')
+    seed_parser.add_argument('--seed', type=int, default=42, help='semilla de los datos sinteticos')
+    seed_parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    seed_parser.set_defaults(handler=seed)
+
+    run_parser = commands.add_parser('run', help='mide todas las rutas')
+    run_parser.add_argument('--driver', choices=['client', 'gunicorn'], default='client')
+    run_parser.add_argument('--scale', help='vuelve a sembrar la base antes de medir (las escrituras la modifican)')
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--requests', type=int, default=200, help='peticiones medidas por ruta')
+    run_parser.add_argument('--warmup', type=int, default=10, help='peticiones previas sin medir')
+    run_parser.add_argument('--workers', type=int, default=2, help='workers de gunicorn')
+    run_parser.add_argument('--profile', choices=['plain', 'sync', 'gthread', 'async'], default='plain',
+                            help='perfil de config/gunicorn_profiles.py (plain: gunicorn sin configuracion)')
+    run_parser.add_argument('--concurrency', type=int, default=4, help='peticiones simultaneas contra gunicorn')
+    run_parser.add_argument('--only', help='mide solo las rutas que contienen este texto')
+    run_parser.add_argument('--encoding', default='identity',
+                            help='Accept-Encoding de las peticiones (identity, gzip, br, zstd)')
+    run_parser.add_argument('--cache', choices=['on', 'off'], default='on',
+                            help='off desactiva los caches de respuestas y entidades para medir la base de datos')
+    run_parser.add_argument('--output', help='fichero JSON de resultados (por defecto, stdout)')
+    run_parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser('compare', help='compara dos ejecuciones')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help='porcentaje que cuenta como regresion')
+    compare_parser.add_argument('--min-ms', type=float, default=0.5, help='empeoramiento minimo en ms')
+    compare_parser.add_argument('--verbose', action='store_true', help='muestra tambien las metricas sin cambios')
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# Microbenchmark del coste por fila de serializar un listado de vehiculos
+# (la tabla mas ancha), desde la consulta hasta el cuerpo JSON:
+#
+#   python bench/serialize_bench.py --rows 10000
+#
+#   orm+serialize   entidades del ORM, Model.serialize() y el proveedor JSON
+#   rows+encoder    select por columnas y RowEncoder, sin entidades ni dicts
+#
+# Cada variante se mide con el proveedor por defecto de Flask y con orjson.
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+from app import create_app  # noqa: E402
+from encoding import OrjsonProvider, orjson, row_encoder, json_page  # noqa: E402
+from models import db, Vehiculos  # noqa: E402
+from serializers import column_fields  # noqa: E402
+from utils import project_columns  # noqa: E402
+
+
+app = create_app({'APP_COMPONENTS': 'api'})
+
+
+def seed(rows):
+    db.create_all()
+    db.session.execute(db.insert(Vehiculos), [{
+        'name': f'Vehiculo {i}', 'model': f'Modelo {i}', 'vehicle_class': 'wheeled',
+        'manufacturer': 'Corellia Mining Corporation', 'cost_in_credits': str(1000 + i), 'length': '36.8',
+        'crew': '46', 'passengers': '30', 'max_atmosphering_speed': '30', 'cargo_capacity': '50000',
+        'consumables': '2 months', 'films': '["https://swapi.dev/api/films/1/"]', 'pilots': '[]',
+    } for i in range(rows)])
+    db.session.commit()
+
+
+def orm_serialize(provider):
+    entities = Vehiculos.query.order_by(Vehiculos.id).all()
+    body = provider.response({'results': [v.serialize() for v in entities], 'next': None}).get_data()
+    db.session.expunge_all()
+    return body
+
+
+def rows_encoder(provider):
+    fields = column_fields(Vehiculos)
+    columns = project_columns(Vehiculos, fields)
+    encode = row_encoder(columns, fields, provider)
+    rows = db.session.execute(db.select(*columns).order_by(Vehiculos.id)).all()
+    return json_page(encode, rows, None).encode()
+
+
+def measure(fn, provider, rows, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(provider)
+        best = min(best, time.perf_counter() - started)
+    return best / rows * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    providers = {'default': DefaultJSONProvider(app)}
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider(app)
+
+    with app.app_context():
+        seed(args.rows)
+        baseline = None
+        print(f'{"variante":16} {"proveedor":10} {"us/fila":>9} {"vs antes":>9}')
+        for name, fn in (('orm+serialize', orm_serialize), ('rows+encoder', rows_encoder)):
+            for provider_name, provider in providers.items():
+                cost = measure(fn, provider, args.rows, args.repeat)
+                baseline = baseline or cost
+                print(f'{name:16} {provider_name:10} {cost:9.2f} {baseline / cost:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# Tiempo de arranque de un worker, desde el import hasta la primera
+# respuesta, con la app completa y en modo solo API:
+#
+#   pipenv run bench seed --scale 1k
+#   python bench/startup_bench.py --runs 10
+#
+# Cada medicion es un interprete nuevo (como un worker de gunicorn sin
+# --preload) que importa app, llama a create_app y atiende una peticion con el
+# test client. Se informa la mediana y el minimo de cada fase:
+#
+#   import         from app import create_app (modelos, rutas, extensiones)
+#   create_app     componentes y conexion de las extensiones a la app
+#   first_request  primera peticion, incluida la primera conexion a la base
+#   process        desde que se lanza el proceso hasta que termina
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+DEFAULT_DATABASE_URL = 'sqlite:////tmp/bench.db'
+
+MODES = {
+    'api': 'api',
+    'full': 'full',
+}
+PHASES = ('import', 'create_app', 'first_request', 'process')
+
+
+def child(mode, path):
+    started = time.perf_counter()
+    sys.path.insert(0, SRC)
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app({'APP_COMPONENTS': MODES[mode]})
+    created = time.perf_counter()
+    status = app.test_client().get(path).status_code
+    done = time.perf_counter()
+    print(json.dumps({
+        'import': imported - started,
+        'create_app': created - imported,
+        'first_request': done - created,
+        'status': status,
+        'modules': len(sys.modules),
+    }))
+
+
+def measure(mode, args):
+    env = dict(os.environ, DATABASE_URL=args.database_url)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, __file__, '--child', mode, '--path', args.path],
+                            env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample['process'] = time.perf_counter() - started
+    return sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiempo de arranque por modo de la app')
+    parser.add_argument('--runs', type=int, default=10, help='procesos medidos por modo')
+    parser.add_argument('--path', default='/people?limit=1', help='ruta de la primera peticion')
+    parser.add_argument('--output', help='fichero JSON de resultados')
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--child', choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child, args.path)
+
+    report = {}
+    print(f'{"modo":6} {"fase":14} {"mediana ms":>11} {"min ms":>9}')
+    for mode in MODES:
+        # Una ejecucion previa sin medir: calienta la cache de disco y los .pyc
+        measure(mode, args)
+        samples = [measure(mode, args) for _ in range(args.runs)]
+        report[mode] = {
+            'status': sorted({sample['status'] for sample in samples}),
+            'modules': samples[-1]['modules'],
+        }
+        for phase in PHASES:
+            values = [sample[phase] * 1000 for sample in samples]
+            report[mode][f'{phase}_ms'] = {'median': round(statistics.median(values), 2),
+                                           'min': round(min(values), 2)}
+            print(f'{mode:6} {phase:14} {statistics.median(values):11.2f} {min(values):9.2f}')
+        print(f'{mode:6} {"modulos":14} {report[mode]["modules"]:11}  status {report[mode]["status"]}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(report, indent=2) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+# Perfiles de gunicorn. Solo se aplican con -c explicito:
+#   gunicorn -c config/gunicorn_profiles.py --chdir ./src/
+# (no se llama gunicorn.conf.py a proposito: gunicorn carga ese nombre del
+# directorio de trabajo antes de aplicar --chdir, incluso sin -c)
+#
+# GUNICORN_PROFILE elige el tipo de worker:
+#   sync     (por defecto) una peticion a la vez por worker; 2 * CPU + 1 workers
+#   gthread  GUNICORN_THREADS hilos por worker (4); CPU + 1 workers
+#   async    uvicorn (asyncio cooperativo) sobre asgi:application; CPU workers
+# WEB_CONCURRENCY fija el numero de workers en cualquier perfil.
+#
+# Todos los perfiles precargan la app en el master (los workers comparten sus
+# paginas de memoria copy-on-write hasta que las escriben).
+#
+# Los workers no se reciclan por defecto: cada reciclado vacia los caches en
+# memoria del worker, y la app no tiene fugas de memoria que lo justifiquen
+# (con un worker sync el RSS pasa de 74 a 80 MiB al llenar los caches y se
+# queda en 80 MiB entre las 2000 y las 6000 peticiones). GUNICORN_MAX_REQUESTS
+# lo activa con un margen aleatorio de hasta un 10% (max_requests_jitter) para
+# que no se reinicien todos a la vez; sin GUNICORN_MAX_REQUESTS no hay margen.
+# En el perfil async, al reciclarse, uvicorn cierra las conexiones que ya ha
+# aceptado y aun no ha leido y esos clientes reciben un reset (7 de cada 2000
+# peticiones con GUNICORN_MAX_REQUESTS=100).
+#
+# Este fichero exporta WEB_CONCURRENCY con el numero de workers. Con mas de un
+# worker y el canal de invalidaciones local, los caches en memoria de
+# respuestas y entidades se desactivan (ver cache.py y entity_cache.py); para
+# tenerlos con varios workers hace falta ENTITY_CACHE_CHANNEL=redis.
+#
+# Medicion con bench/bench.py run --driver gunicorn --profile <perfil>
+# --scale 1k --workers 2 --concurrency 8, SQLite, en una maquina de 1 CPU que
+# comparte con el cliente del benchmark. p50 en ms / req/s, mediana de cinco
+# ejecuciones alternas (plano y sync) o de dos (gthread y async). "plano" es
+# gunicorn -c /dev/null: workers sync, sin preload y sin ningun fichero de
+# configuracion. En todas las ejecuciones WEB_CONCURRENCY=2, asi que los
+# caches en memoria estan desactivados en todos los perfiles:
+#
+#   ruta                                plano       sync        gthread     async
+#   GET /people                          39.7 / 201  30.7 / 253  38.3 / 201  47.0 / 170
+#   GET /people/<id>                     31.9 / 245  23.6 / 314  27.2 / 278  36.9 / 213
+#   GET /favorites                       37.7 / 209  33.0 / 230  35.9 / 203  37.2 / 173
+#   GET /users                           47.9 / 164  45.6 / 176  44.0 / 180  54.0 / 146
+#   GET /search                          67.4 / 116  63.9 / 127  63.7 / 123  79.4 / 100
+#   POST /people                         75.6 / 103  66.1 / 120  43.8 / 109  74.9 / 104
+#   POST /users/favorites/people/<id>    64.8 / 118  56.8 / 138  40.6 / 122  79.0 /  98
+#   DELETE /people/<id>                  75.2 / 106  71.8 / 110  41.7 / 105  86.7 /  87
+#   RSS maximo por worker (MiB)          80          77          82          82
+#
+# sync mejora al plano en la mediana de todas las rutas (GET /people/<id>
+# 245 -> 314 req/s; el plano va de 224 a 404 entre ejecuciones y sync de 238
+# a 362), asi que el Procfile arranca gunicorn con este fichero y el perfil
+# sync. async es el mas lento: el bucle de eventos no tiene esperas de red que
+# solapar con SQLite. gthread y async estan pensados para Postgres en otra
+# maquina, donde cada peticion espera a la red.
+
+import os
+
+try:
+    CPUS = len(os.sched_getaffinity(0))
+except AttributeError:
+    CPUS = os.cpu_count() or 1
+
+PROFILES = {
+    'sync': {
+        'worker_class': 'sync',
+        'wsgi_app': 'wsgi:application',
+        'workers': 2 * CPUS + 1,
+        'threads': 1,
+    },
+    'gthread': {
+        'worker_class': 'gthread',
+        'wsgi_app': 'wsgi:application',
+        'workers': CPUS + 1,
+        'threads': int(os.getenv('GUNICORN_THREADS', 4)),
+    },
+    'async': {
+        'worker_class': 'uvicorn.workers.UvicornWorker',
+        'wsgi_app': 'asgi:application',
+        'workers': CPUS,
+        'threads': 1,
+    },
+}
+
+profile_name = os.getenv('GUNICORN_PROFILE', 'sync')
+if profile_name not in PROFILES:
+    raise RuntimeError(f"GUNICORN_PROFILE '{profile_name}' no existe; se admite: {', '.join(PROFILES)}")
+profile = PROFILES[profile_name]
+
+worker_class = profile['worker_class']
+wsgi_app = profile['wsgi_app']
+workers = int(os.getenv('WEB_CONCURRENCY', profile['workers']))
+# La app lo consulta para elegir caches que funcionen con varios procesos
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = profile['threads']
+
+preload_app = True
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# Las consultas mas lentas (listados en streaming, altas masivas) caben de sobra
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+# Conexiones persistentes con el balanceador (gthread y async; sync no las usa)
+keepalive = 5
+
+# El latido de los workers en memoria y no en el disco del contenedor
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+
+def on_starting(server):
+    # Metricas de Prometheus compartidas entre workers: el directorio se
+    # vacia en cada arranque para no mezclar ficheros de procesos anteriores
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith('.db'):
+                os.remove(os.path.join(directory, name))
+
+
+def when_ready(server):
+    server.log.info('perfil %s: %s workers %s, %s hilos', profile_name, workers, worker_class, threads)
+
+
+def post_fork(server, worker):
+    # Con preload_app los engines se crean en el master. Cada worker descarta
+    # el pool heredado sin cerrar sus conexiones (close=False), que siguen
+    # siendo del master, y abre las suyas al primer uso.
+    import sys
+    from models import db
+    for name in ('wsgi', 'asgi'):
+        module = sys.modules.get(name)
+        if module is None:
+            continue
+        flask_app = module.application if name == 'wsgi' else module.app
+        with flask_app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+        if name == 'asgi':
+            for engine in (module.engine, module.replica_engine):
+                if engine is not None:
+                    engine.sync_engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
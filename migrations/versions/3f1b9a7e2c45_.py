@@ -0,0 +1,89 @@
+"""numeric shadow columns for range filters and sorting
+
+Revision ID: 3f1b9a7e2c45
+Revises: c7dc5db70920
+Create Date: 2026-10-18 11:02:17.503861
+
+"""
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1b9a7e2c45'
+down_revision = 'c7dc5db70920'
+branch_labels = None
+depends_on = None
+
+
+# tabla -> {columna de texto: columna numerica}
+NUMERIC_COLUMNS = {
+    'personajes': {'mass': 'mass_num', 'height': 'height_num'},
+    'planetas': {'diameter': 'diameter_num', 'population': 'population_num'},
+    'vehiculos': {'cost_in_credits': 'cost_in_credits_num', 'length': 'length_num', 'crew': 'crew_num'},
+}
+
+NULL_NUMBERS = {'', 'unknown', 'n/a', 'none', 'indefinite'}
+
+BATCH_SIZE = 1000
+
+
+def parse_number(value):
+    # Copia de models.parse_number: las migraciones no importan el codigo de la app
+    if value is None:
+        return None
+    text = str(value).strip().lower().replace(',', '')
+    if text in NULL_NUMBERS:
+        return None
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def backfill(table_name, columns):
+    bind = op.get_bind()
+    table = sa.table(table_name, sa.column('id'), *[sa.column(c) for c in columns],
+                     *[sa.column(c) for c in columns.values()])
+    update = (
+        table.update()
+        .where(table.c.id == sa.bindparam('row_id'))
+        .values({shadow: sa.bindparam(shadow) for shadow in columns.values()})
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(table.c.id, *[table.c[c] for c in columns])
+            .where(table.c.id > last_id).order_by(table.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(update, [
+            {'row_id': row.id, **{shadow: parse_number(row._mapping[source]) for source, shadow in columns.items()}}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+
+def upgrade():
+    for table_name, columns in NUMERIC_COLUMNS.items():
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for shadow in columns.values():
+                batch_op.add_column(sa.Column(shadow, sa.Float(), nullable=True))
+
+        backfill(table_name, columns)
+
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for shadow in columns.values():
+                batch_op.create_index(batch_op.f(f'ix_{table_name}_{shadow}'), [shadow], unique=False)
+
+
+def downgrade():
+    for table_name, columns in NUMERIC_COLUMNS.items():
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for shadow in columns.values():
+                batch_op.drop_index(batch_op.f(f'ix_{table_name}_{shadow}'))
+                batch_op.drop_column(shadow)
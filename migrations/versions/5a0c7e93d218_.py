@@ -0,0 +1,59 @@
+"""full-text search index for the catalog
+
+Revision ID: 5a0c7e93d218
+Revises: 8e4d2b61f0a7
+Create Date: 2026-10-18 12:31:08.774520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a0c7e93d218'
+down_revision = '8e4d2b61f0a7'
+branch_labels = None
+depends_on = None
+
+
+# Postgres: tsvector generado por tabla (nombre con peso A, resto con peso B)
+POSTGRES_VECTORS = {
+    'personajes': "setweight(to_tsvector('simple', coalesce(name, '')), 'A')",
+    'planetas': "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+                "setweight(to_tsvector('simple', coalesce(climate, '') || ' ' || coalesce(terrain, '')), 'B')",
+    'vehiculos': "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+                 "setweight(to_tsvector('simple', coalesce(model, '') || ' ' || coalesce(manufacturer, '') "
+                 "|| ' ' || coalesce(vehicle_class, '')), 'B')",
+}
+
+# SQLite: contenido inicial de la tabla FTS5 a partir del catalogo existente
+SQLITE_BACKFILL = {
+    'people': "SELECT 'people', id, name, '' FROM personajes",
+    'planets': "SELECT 'planets', id, name, climate || ' ' || terrain FROM planetas",
+    'vehicles': "SELECT 'vehicles', id, name, model || ' ' || manufacturer || ' ' || vehicle_class FROM vehiculos",
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table, vector in POSTGRES_VECTORS.items():
+            op.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED")
+            op.execute(f"CREATE INDEX ix_{table}_search_vector ON {table} USING GIN (search_vector)")
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE catalog_search USING fts5("
+            "kind UNINDEXED, entity_id UNINDEXED, name, body, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        for select in SQLITE_BACKFILL.values():
+            op.execute(f"INSERT INTO catalog_search (kind, entity_id, name, body) {select}")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in POSTGRES_VECTORS:
+            op.execute(f"DROP INDEX ix_{table}_search_vector")
+            op.execute(f"ALTER TABLE {table} DROP COLUMN search_vector")
+    elif dialect == 'sqlite':
+        op.execute("DROP TABLE catalog_search")
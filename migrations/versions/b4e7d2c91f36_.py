@@ -0,0 +1,44 @@
+"""favorite counters for the leaderboard
+
+Revision ID: b4e7d2c91f36
+Revises: 5a0c7e93d218
+Create Date: 2026-10-18 16:02:41.518307
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e7d2c91f36'
+down_revision = '5a0c7e93d218'
+branch_labels = None
+depends_on = None
+
+
+# tabla -> columna de favorito que la referencia
+COUNTED_TABLES = {
+    'personajes': 'personajes_id',
+    'planetas': 'planetas_id',
+    'vehiculos': 'vehiculos_id',
+}
+
+
+def upgrade():
+    for table, column in COUNTED_TABLES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('favorites_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.create_index(batch_op.f(f'ix_{table}_favorites_count'), ['favorites_count'], unique=False)
+
+        # Valor inicial a partir de los favoritos existentes
+        op.execute(
+            f'UPDATE {table} SET favorites_count = '
+            f'(SELECT COUNT(*) FROM favorito WHERE favorito.{column} = {table}.id)'
+        )
+
+
+def downgrade():
+    for table in reversed(list(COUNTED_TABLES)):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f(f'ix_{table}_favorites_count'))
+            batch_op.drop_column('favorites_count')
@@ -0,0 +1,118 @@
+"""unique favorite per user and entity
+
+Revision ID: c7dc5db70920
+Revises: 6c9c62a69d1a
+Create Date: 2026-10-18 10:12:40.118245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7dc5db70920'
+down_revision = '6c9c62a69d1a'
+branch_labels = None
+depends_on = None
+
+
+FAVORITE_COLUMNS = ('personajes_id', 'planetas_id', 'vehiculos_id')
+
+
+def create_model_tables():
+    # La revision 6c9c62a69d1a borro las tablas que usa models.py
+    # (personajes, planetas, usuario, vehiculos, favorito); se recrean aqui
+    # con el mismo esquema de d6c496d1a96e para que la cadena sea aplicable.
+    op.create_table('personajes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('mass', sa.String(length=120), nullable=False),
+    sa.Column('hair_color', sa.String(length=120), nullable=False),
+    sa.Column('skin_color', sa.String(length=120), nullable=False),
+    sa.Column('eye_color', sa.String(length=120), nullable=False),
+    sa.Column('birth_year', sa.String(length=120), nullable=False),
+    sa.Column('gender', sa.String(length=120), nullable=False),
+    sa.Column('height', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('planetas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('diameter', sa.String(length=120), nullable=False),
+    sa.Column('rotation_period', sa.String(length=120), nullable=False),
+    sa.Column('orbital_period', sa.String(length=120), nullable=False),
+    sa.Column('gravity', sa.String(length=120), nullable=False),
+    sa.Column('population', sa.String(length=120), nullable=False),
+    sa.Column('climate', sa.String(length=120), nullable=False),
+    sa.Column('terrain', sa.String(length=120), nullable=False),
+    sa.Column('surface_water', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('usuario',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nombre', sa.String(length=120), nullable=False),
+    sa.Column('apellido', sa.String(length=120), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('password', sa.String(length=80), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email')
+    )
+    op.create_table('vehiculos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('model', sa.String(length=120), nullable=False),
+    sa.Column('vehicle_class', sa.String(length=120), nullable=False),
+    sa.Column('manufacturer', sa.String(length=120), nullable=False),
+    sa.Column('cost_in_credits', sa.String(length=120), nullable=False),
+    sa.Column('length', sa.String(length=120), nullable=False),
+    sa.Column('crew', sa.String(length=120), nullable=False),
+    sa.Column('passengers', sa.String(length=120), nullable=False),
+    sa.Column('max_atmosphering_speed', sa.String(length=120), nullable=False),
+    sa.Column('cargo_capacity', sa.String(length=120), nullable=False),
+    sa.Column('consumables', sa.String(length=120), nullable=False),
+    sa.Column('films', sa.String(length=120), nullable=False),
+    sa.Column('pilots', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('model'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('favorito',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('usuario_id', sa.Integer(), nullable=True),
+    sa.Column('personajes_id', sa.Integer(), nullable=True),
+    sa.Column('vehiculos_id', sa.Integer(), nullable=True),
+    sa.Column('planetas_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['personajes_id'], ['personajes.id'], ),
+    sa.ForeignKeyConstraint(['planetas_id'], ['planetas.id'], ),
+    sa.ForeignKeyConstraint(['usuario_id'], ['usuario.id'], ),
+    sa.ForeignKeyConstraint(['vehiculos_id'], ['vehiculos.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table('favorito'):
+        create_model_tables()
+
+    # Borra los duplicados existentes (se conserva el favorito mas antiguo)
+    # antes de crear los indices unicos.
+    for column in FAVORITE_COLUMNS:
+        op.execute(
+            f"DELETE FROM favorito WHERE {column} IS NOT NULL AND id NOT IN ("
+            f"SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM favorito "
+            f"WHERE {column} IS NOT NULL GROUP BY usuario_id, {column}) AS keep)"
+        )
+
+    with op.batch_alter_table('favorito', schema=None) as batch_op:
+        batch_op.create_index('ix_favorito_usuario_personajes', ['usuario_id', 'personajes_id'], unique=True)
+        batch_op.create_index('ix_favorito_usuario_planetas', ['usuario_id', 'planetas_id'], unique=True)
+        batch_op.create_index('ix_favorito_usuario_vehiculos', ['usuario_id', 'vehiculos_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('favorito', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorito_usuario_vehiculos')
+        batch_op.drop_index('ix_favorito_usuario_planetas')
+        batch_op.drop_index('ix_favorito_usuario_personajes')
@@ -1,39 +1,273 @@
 
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
-from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
+import click
+from flask import Blueprint, Flask, current_app, request, jsonify, url_for
+from flask.cli import FlaskGroup
+from utils import (APIException, generate_sitemap, parse_page_args, keyset_page,
+                   wants_stream, iter_keyset_batches, stream_json_array,
+                   parse_fields, encode_cursor, decode_cursor,
+                   parse_int_arg, project_columns, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+from encoding import init_json, row_encoder, json_page, json_response
+from serializers import serializer, serializable_fields, column_fields
+from filters import parse_filters, parse_sort
+from cache import ResponseCache, response_cache, cached
+from compression import Compression
+from entity_cache import EntityCache, entity_cache
+from channel import channel_from_env
+from replica import ReplicaRouter, replica_router, replica_reads, replica_bind_from_env, REPLICA_BIND
+from bulk import bulk_create, MAX_BULK_ITEMS
+from favorites import (insert_favorite, favorites_cli, parse_batch, apply_batch,
+                       favorite_ids_query, group_favorite_ids)
+from search import search, query_terms, index_entity, remove_entity, include_object
+from pool import PoolStats, engine_options_from_env, pool_stats
+from metrics import RequestMetrics, attach_engine
+from tracker import QueryBudgets, query_budget, attach_tracker
+from loader import catalog_cli
 from models import db, Personajes, Planetas, Favorito, Vehiculos, Usuario
+from sqlalchemy.orm import joinedload, selectinload, noload
 import json
 # from models import Person
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
+# Componentes opcionales de la app. Cada uno importa su dependencia solo si se
+# activa, asi que un worker que solo sirve la API no carga flask_admin,
+# flask_swagger ni alembic:
+#   APP_COMPONENTS=full                    admin, swagger, migrate y cors (por defecto)
+#   APP_COMPONENTS=api                     solo cors
+#   APP_COMPONENTS=cors,migrate            lista explicita
+COMPONENT_PRESETS = {
+    'full': ('admin', 'swagger', 'migrate', 'cors'),
+    'api': ('cors',),
+}
 
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
-setup_admin(app)
+def init_admin(app):
+    from admin import setup_admin
+    setup_admin(app)
+
+
+def init_swagger(app):
+    from flask_swagger import swagger
+
+    @query_budget(0)
+    def handle_spec():
+        # Especificacion Swagger generada a partir de las rutas
+        return jsonify(swagger(current_app)), 200
+
+    app.add_url_rule('/spec', 'handle_spec', handle_spec, methods=['GET'])
+
+
+def init_migrate(app):
+    from flask_migrate import Migrate
+    Migrate(app, db, include_object=include_object)
+
+
+def init_cors(app):
+    from flask_cors import CORS
+    CORS(app)
+
+
+COMPONENTS = {
+    'admin': init_admin,
+    'swagger': init_swagger,
+    'migrate': init_migrate,
+    'cors': init_cors,
+}
+
+
+def parse_components(value):
+    names = value.split(',') if isinstance(value, str) else list(value)
+    selected = []
+    for name in (name.strip() for name in names):
+        for component in COMPONENT_PRESETS.get(name, (name,)):
+            if component not in COMPONENTS:
+                raise ValueError(f"Componente desconocido '{component}', se admite: {', '.join(COMPONENTS)}")
+            if component not in selected:
+                selected.append(component)
+    return selected
+
+
+def database_config(uri=None):
+    if uri is None:
+        db_url = os.getenv("DATABASE_URL")
+        if db_url is not None:
+            uri = db_url.replace("postgres://", "postgresql://")
+        else:
+            uri = "sqlite:////tmp/test.db"
+    return {
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options_from_env(uri),
+        'SQLALCHEMY_BINDS': replica_bind_from_env(engine_options_from_env),
+    }
+
+
+def flask_cli_running():
+    # Dentro de `flask ...` el comando raiz de click es un FlaskGroup; otras
+    # CLI (uvicorn, gunicorn) tambien tienen contexto de click pero no cuentan
+    context = click.get_current_context(silent=True)
+    return context is not None and isinstance(context.find_root().command, FlaskGroup)
+
+
+def create_app(config=None):
+    # config: claves de configuracion que sustituyen a las que salen del
+    # entorno, p. ej. create_app({'APP_COMPONENTS': 'api'})
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+    config = config or {}
+    app.config.from_mapping(database_config(config.get('SQLALCHEMY_DATABASE_URI')))
+    app.config['APP_COMPONENTS'] = os.getenv('APP_COMPONENTS', 'full')
+    app.config.from_mapping(config)
+    components = parse_components(app.config['APP_COMPONENTS'])
+    # Los comandos `flask db ...` necesitan Migrate aunque los workers no lo carguen
+    if 'migrate' not in components and flask_cli_running():
+        components.append('migrate')
+
+    # Cada app tiene sus propias extensiones en app.extensions (caches,
+    # replica, estadisticas); los nombres de modulo como response_cache o
+    # entity_cache apuntan a las de la app que atiende la peticion
+    db.init_app(app)
+    PoolStats(app, db)
+    with app.app_context():
+        attach_engine(db.engine)
+        attach_tracker(db.engine)
+        if REPLICA_BIND in db.engines:
+            attach_engine(db.engines[REPLICA_BIND])
+            attach_tracker(db.engines[REPLICA_BIND])
+    router = ReplicaRouter(app, db)
+    init_json(app)
+    # Un canal de invalidaciones por app, compartido por los dos caches
+    channel = app.config.get('ENTITY_CACHE_CHANNEL') or channel_from_env()
+    ResponseCache(app, channel=channel)
+    EntityCache(app, channel=channel)
+    # Las invalidaciones de cualquier worker mantienen un momento las lecturas en
+    # el primario, para no volver a guardar en cache datos de una replica atrasada
+    channel.subscribe(lambda message: router.hold_primary())
+    RequestMetrics(app)
+    QueryBudgets(app)
+    # Despues de metricas y control de consultas: su after_request se ejecuta
+    # antes, asi que los tamanos que registran son los ya comprimidos
+    Compression(app)
+    for name in components:
+        COMPONENTS[name](app)
+    app.extensions['components'] = components
+
+    app.register_blueprint(api)
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(favorites_cli)
+    return app
+
+
+api = Blueprint('api', __name__)
+
+# Estrategias de carga ansiosa por endpoint: evitan el N+1 de Favorito.serialize()
+# (personajes, vehiculos y planetas) y de Usuario.serialize() (usuario_favoritos).
+FAVORITO_EAGER = (
+    joinedload(Favorito.personajes),
+    joinedload(Favorito.vehiculos),
+    joinedload(Favorito.planetas),
+)
+USUARIO_EAGER = (
+    selectinload(Usuario.usuario_favoritos).options(*FAVORITO_EAGER),
+)
+
+# Claves que admite ?fields= en favoritos y usuarios. Las relaciones que no se
+# piden no se cargan (noload), asi que tampoco cuestan consultas.
+FAVORITO_FIELDS = serializable_fields(Favorito)
+FAVORITO_RELATIONS = {key: getattr(Favorito, relation) for key, relation in Favorito.SERIALIZE_RELATIONS.items()}
+USUARIO_FIELDS = serializable_fields(Usuario)
+
+
+def favorito_options(fields):
+    if fields is None:
+        return FAVORITO_EAGER
+    return tuple(joinedload(rel) if key in fields else noload(rel)
+                 for key, rel in FAVORITO_RELATIONS.items())
+
+
+def usuario_options(fields):
+    if fields is None or 'usuario_favoritos' in fields:
+        return USUARIO_EAGER
+    return (noload(Usuario.usuario_favoritos),)
+
+
+def catalog_query(model, fields, extra=()):
+    # Consulta por columnas y encoder de filas a JSON: no se crean entidades
+    # del ORM ni diccionarios. Sin ?fields= se emite lo mismo que serialize().
+    fields = fields or column_fields(model)
+    columns = project_columns(model, fields, extra)
+    return model.query.with_entities(*columns), row_encoder(columns, fields, current_app.json)
+
+
+def catalog_list(model, empty_message):
+    # Listado comun de personajes, planetas y vehiculos: proyeccion (?fields=),
+    # filtros y orden (?height_gt=180&sort=-mass), paginacion por cursor y
+    # modo streaming.
+    fields = parse_fields(request.args, column_fields(model))
+    sort = parse_sort(request.args, model)
+    filters = parse_filters(request.args, model)
+    query, encode = catalog_query(model, fields, extra=[sort[0]] if sort else ())
+    query = query.filter(*filters)
+
+    if wants_stream(request.args):
+        response = stream_json_array(iter_keyset_batches(query, model.id, sort=sort), encode=encode)
+        if response is None:
+            return jsonify({'msj': empty_message}), 404
+        return response
+
+    limit, after = parse_page_args(request.args, sort)
+    page, next_cursor = keyset_page(query, model.id, limit, after, sort)
+
+    if not page and after is None and not filters:
+        return jsonify({'msj': empty_message}), 404
+
+    if sort is not None and next_cursor is not None:
+        next_cursor = encode_cursor(next_cursor)
+    return json_response(json_page(encode, page, next_cursor))
+
+
+def catalog_detail(model, resource, entity_id, missing_message):
+    # Detalle comun de personajes, planetas y vehiculos. El cuerpo codificado
+    # se guarda en entity_cache; los 404 no se guardan.
+    fields = parse_fields(request.args, column_fields(model))
+    body, generation = entity_cache.lookup(resource, entity_id, fields)
+    if body is None:
+        query, encode = catalog_query(model, fields)
+        row = query.filter(model.id == entity_id).first()
+        if not row:
+            return jsonify({'msj': missing_message}), 404
+        body = encode(row)
+        entity_cache.store(resource, entity_id, fields, body, generation)
+    return json_response(body)
+
+
+PEOPLE_FIELDS = ['name', 'mass', 'hair_color', 'skin_color',
+                 'eye_color', 'birth_year', 'gender', 'height']
+PLANET_FIELDS = ['name', 'diameter', 'rotation_period',
+                 'orbital_period', 'gravity', 'population',
+                 'climate', 'terrain', 'surface_water']
+VEHICLE_FIELDS = [
+    'name', 'model', 'vehicle_class', 'manufacturer',
+    'cost_in_credits', 'length', 'crew', 'passengers',
+    'max_atmosphering_speed', 'cargo_capacity',
+    'consumables', 'films', 'pilots'
+]
+
+
+def prepare_vehicle(row):
+    row['films'] = json.dumps(row['films'])
+    row['pilots'] = json.dumps(row['pilots'])
+    return row
 
 # Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
 # Generate sitemap with all your endpoints
-@app.route('/')
+@api.route('/')
+@query_budget(0)
 def sitemap():
-    return generate_sitemap(app)
+    return generate_sitemap(current_app)
 
 
 # Endpoints INICIO
@@ -41,36 +275,39 @@ def sitemap():
 
 """-----------------------------------------------_<People>_-------------------------------------"""
 
-@app.route('/people', methods=['GET'])
+@api.route('/people', methods=['GET'])
+@query_budget(1)
+@replica_reads
+@cached('people')
 def handle_people():
-    all_people = Personajes.query.all()
-    people_list = [p.serialize() for p in all_people]
-
-    if not people_list:
-        return jsonify({'msj': 'no hay personajes'}), 404
+    return catalog_list(Personajes, 'no hay personajes')
 
-    return jsonify(people_list), 200
 
-
-@app.route('/people/<int:people_id>', methods=['GET'])
+@api.route('/people/<int:people_id>', methods=['GET'])
+@query_budget(1)
+@replica_reads
+@cached('people')
 def handle_people_id(people_id):
-    one_person = Personajes.query.filter_by(id=people_id).first()
-
-    if not one_person:
-        return jsonify({'msj': 'El personaje no existe'}), 404
-
-    return jsonify(one_person.serialize()), 200
+    return catalog_detail(Personajes, 'people', people_id, 'El personaje no existe')
 
 
-@app.route('/people', methods=['POST'])
+@api.route('/people', methods=['POST'])
+@query_budget(4)
 def create_people():
     try:
         request_body = request.get_json()
         if not request_body:
             return jsonify({"message": "Solicitud JSON inválida"}), 400
 
-        required_fields = ['name', 'mass', 'hair_color', 'skin_color',
-                           'eye_color', 'birth_year', 'gender', 'height']
+        if isinstance(request_body, list):
+            if len(request_body) > MAX_BULK_ITEMS:
+                return jsonify({"message": f"Se admiten como máximo {MAX_BULK_ITEMS} elementos por solicitud"}), 413
+            results, created = bulk_create(Personajes, request_body, PEOPLE_FIELDS)
+            if created:
+                response_cache.invalidate('people')
+            return jsonify({"results": results}), 201 if created == len(results) else 207
+
+        required_fields = PEOPLE_FIELDS
         missing_fields = [field for field in required_fields if field not in request_body]
         if missing_fields:
             return jsonify({"message": f"Faltan los campos: {', '.join(missing_fields)}"}), 400
@@ -91,7 +328,11 @@ def create_people():
             height=request_body['height']
         )
         db.session.add(new_person)
+        db.session.flush()
+        index_entity(new_person)
         db.session.commit()
+        response_cache.invalidate('people')
+        entity_cache.invalidate('people', new_person.id)
         return jsonify(new_person.serialize()), 201  
 
     except KeyError as ke:
@@ -101,14 +342,18 @@ def create_people():
         return jsonify({"message": f"Error interno del servidor: {str(e)}"}), 500
 
 
-@app.route('/people/<int:people_id>', methods=['DELETE'])
+@api.route('/people/<int:people_id>', methods=['DELETE'])
+@query_budget(3)
 def delete_people(people_id):
     try:
         existing_person = Personajes.query.filter_by(id=people_id).first()
 
         if existing_person:
             db.session.delete(existing_person)
+            remove_entity(Personajes, people_id)
             db.session.commit()
+            response_cache.invalidate('people')
+            entity_cache.invalidate('people', people_id)
             return jsonify({"message": "El personaje ha sido eliminado"}), 200
 
         return jsonify({"message": "El personaje que intenta eliminar no existe"}), 404
@@ -117,33 +362,29 @@ def delete_people(people_id):
         return jsonify({"message": f"Error interno del servidor: {str(e)}"}), 500
 
 
-@app.route('/users/favorites/people/<int:people_id>', methods=['POST'])
+@api.route('/users/favorites/people/<int:people_id>', methods=['POST'])
+@query_budget(3)
 def create_fav_people(people_id):
     try:
         
         usuario_id = 1
 
-        if not Usuario.query.filter_by(id=usuario_id).first():
-            return jsonify({"message": "El usuario al que le quiere añadir un favorito no existe"}), 404
+        favorito_id = insert_favorite(usuario_id, Personajes, people_id)
 
-        if not Personajes.query.filter_by(id=people_id).first():
-            return jsonify({"message": "El personaje que quiere añadir a favoritos no existe"}), 404
+        if favorito_id is None:
+            db.session.rollback()
+            # Solo en el camino de error averiguamos por que no se inserto
+            if not Usuario.query.filter_by(id=usuario_id).first():
+                return jsonify({"message": "El usuario al que le quiere añadir un favorito no existe"}), 404
 
-        existing_favorito = Favorito.query.filter_by(personajes_id=people_id, usuario_id=usuario_id).first()
+            if not Personajes.query.filter_by(id=people_id).first():
+                return jsonify({"message": "El personaje que quiere añadir a favoritos no existe"}), 404
 
-        if existing_favorito:
-            return jsonify({"message": "El personaje ya está en favoritos"}), 409  # Changed to 409 Conflict
+            return jsonify({"message": "El personaje ya está en favoritos"}), 409
 
-        new_favorito = Favorito(
-            usuario_id=usuario_id,
-            personajes_id=people_id,
-            vehiculos_id=None,
-            planetas_id=None
-        )
-        db.session.add(new_favorito)
         db.session.commit()
 
-        print(new_favorito.serialize())
+        new_favorito = Favorito.query.options(*FAVORITO_EAGER).filter_by(id=favorito_id).first()
         return jsonify(new_favorito.serialize()), 201 
 
     except Exception as e:
@@ -151,7 +392,8 @@ def create_fav_people(people_id):
         return jsonify({"message": f"Error interno del servidor: {str(e)}"}), 500
 
 
-@app.route('/users/favorites/people/<int:people_id>', methods=['DELETE'])
+@api.route('/users/favorites/people/<int:people_id>', methods=['DELETE'])
+@query_budget(3)
 def delete_fav_people(people_id):
     try:
         
@@ -181,37 +423,39 @@ def delete_fav_people(people_id):
 """-----------------------------------------------_<Planets>_-------------------------------------"""
 
 
-@app.route('/planets', methods=['GET'])
+@api.route('/planets', methods=['GET'])
+@query_budget(1)
+@replica_reads
+@cached('planets')
 def handle_planets():
-    all_planets = Planetas.query.all()
-    planets_list = [p.serialize() for p in all_planets]
-
-    if not planets_list:
-        return jsonify({'msj': 'no hay planetas'}), 404
-
-    return jsonify(planets_list), 200
+    return catalog_list(Planetas, 'no hay planetas')
 
 
-@app.route('/planets/<int:planet_id>', methods=['GET'])
+@api.route('/planets/<int:planet_id>', methods=['GET'])
+@query_budget(1)
+@replica_reads
+@cached('planets')
 def handle_planet_id(planet_id):
-    one_planet = Planetas.query.filter_by(id=planet_id).first()
+    return catalog_detail(Planetas, 'planets', planet_id, 'El planeta no existe')
 
-    if not one_planet:
-        return jsonify({'msj': 'El planeta no existe'}), 404
 
-    return jsonify(one_planet.serialize()), 200
-
-
-@app.route('/planets', methods=['POST'])
+@api.route('/planets', methods=['POST'])
+@query_budget(4)
 def create_planet():
     try:
         request_body = request.get_json()
         if not request_body:
             return jsonify({"message": "Solicitud JSON inválida"}), 400
 
-        required_fields = ['name', 'diameter', 'rotation_period',
-                           'orbital_period', 'gravity', 'population',
-                           'climate', 'terrain', 'surface_water']
+        if isinstance(request_body, list):
+            if len(request_body) > MAX_BULK_ITEMS:
+                return jsonify({"message": f"Se admiten como máximo {MAX_BULK_ITEMS} elementos por solicitud"}), 413
+            results, created = bulk_create(Planetas, request_body, PLANET_FIELDS)
+            if created:
+                response_cache.invalidate('planets')
+            return jsonify({"results": results}), 201 if created == len(results) else 207
+
+        required_fields = PLANET_FIELDS
         missing_fields = [field for field in required_fields if field not in request_body]
         if missing_fields:
             return jsonify({"message": f"Faltan los campos: {', '.join(missing_fields)}"}), 400
@@ -233,7 +477,11 @@ def create_planet():
             surface_water=request_body['surface_water']
         )
         db.session.add(new_planet)
+        db.session.flush()
+        index_entity(new_planet)
         db.session.commit()
+        response_cache.invalidate('planets')
+        entity_cache.invalidate('planets', new_planet.id)
         return jsonify(new_planet.serialize()), 201  
 
     except KeyError as ke:
@@ -243,14 +491,18 @@ def create_planet():
         return jsonify({"message": f"Error interno del servidor: {str(e)}"}), 500
 
 
-@app.route('/planets/<int:planet_id>', methods=['DELETE'])
+@api.route('/planets/<int:planet_id>', methods=['DELETE'])
+@query_budget(3)
 def delete_planet(planet_id):
     try:
         existing_planet = Planetas.query.filter_by(id=planet_id).first()
 
         if existing_planet:
             db.session.delete(existing_planet)
+            remove_entity(Planetas, planet_id)
             db.session.commit()
+            response_cache.invalidate('planets')
+            entity_cache.invalidate('planets', planet_id)
             return jsonify({"message": "El planeta ha sido eliminado"}), 200
 
         return jsonify({"message": "El planeta que intenta eliminar no existe"}), 404
@@ -259,41 +511,38 @@ def delete_planet(planet_id):
         return jsonify({"message": f"Error interno del servidor: {str(e)}"}), 500
 
 
-@app.route('/users/favorites/planet/<int:planet_id>', methods=['POST'])
+@api.route('/users/favorites/planet/<int:planet_id>', methods=['POST'])
+@query_budget(3)
 def create_fav_planet(planet_id):
     try:
         
         usuario_id = 1
 
-        if not Usuario.query.filter_by(id=usuario_id).first():
-            return jsonify({"message": "El usuario al que le quiere añadir un favorito no existe"}), 404
+        favorito_id = insert_favorite(usuario_id, Planetas, planet_id)
 
-        if not Planetas.query.filter_by(id=planet_id).first():
-            return jsonify({"message": "El planeta que quiere añadir a favoritos no existe"}), 404
+        if favorito_id is None:
+            db.session.rollback()
+            # Solo en el camino de error averiguamos por que no se inserto
+            if not Usuario.query.filter_by(id=usuario_id).first():
+                return jsonify({"message": "El usuario al que le quiere añadir un favorito no existe"}), 404
 
-        existing_favorito = Favorito.query.filter_by(planetas_id=planet_id, usuario_id=usuario_id).first()
+            if not Planetas.query.filter_by(id=planet_id).first():
+                return jsonify({"message": "El planeta que quiere añadir a favoritos no existe"}), 404
 
-        if existing_favorito:
-            return jsonify({"message": "El planeta ya está en favoritos"}), 409  
+            return jsonify({"message": "El planeta ya está en favoritos"}), 409
 
-        new_favorito = Favorito(
-            usuario_id=usuario_id,
-            personajes_id=None,
-            vehiculos_id=None,
-            planetas_id=planet_id
-        )
-        db.session.add(new_favorito)
         db.session.commit()
 
-        print(new_favorito.serialize())
-        return jsonify(new_favorito.serialize()), 201  
+        new_favorito = Favorito.query.options(*FAVORITO_EAGER).filter_by(id=favorito_id).first()
+        return jsonify(new_favorito.serialize()), 201 
 
     except Exception as e:
         db.session.rollback()
         return jsonify({"message": f"Error interno del servidor: {str(e)}"}), 500
 
 
-@app.route('/users/favorites/planet/<int:planet_id>', methods=['DELETE'])
+@api.route('/users/favorites/planet/<int:planet_id>', methods=['DELETE'])
+@query_budget(3)
 def delete_fav_planet(planet_id):
     try:
         
@@ -323,40 +572,40 @@ def delete_fav_planet(planet_id):
 """-----------------------------------------------_<Vehicles>_-------------------------------------"""
 
 
-@app.route('/vehicles', methods=['GET'])
+@api.route('/vehicles', methods=['GET'])
+@query_budget(1)
+@replica_reads
+@cached('vehicles')
 def handle_vehicles():
-    all_vehicles = Vehiculos.query.all()
-    vehicles_list = [v.serialize() for v in all_vehicles]
-
-    if not vehicles_list:
-        return jsonify({'msj': 'no hay vehiculos'}), 404
-
-    return jsonify(vehicles_list), 200
+    return catalog_list(Vehiculos, 'no hay vehiculos')
 
 
-@app.route('/vehicles/<int:vehicle_id>', methods=['GET'])
+@api.route('/vehicles/<int:vehicle_id>', methods=['GET'])
+@query_budget(1)
+@replica_reads
+@cached('vehicles')
 def handle_vehicle_id(vehicle_id):
-    one_vehicle = Vehiculos.query.filter_by(id=vehicle_id).first()
+    return catalog_detail(Vehiculos, 'vehicles', vehicle_id, 'El vehiculo no existe')
 
-    if not one_vehicle:
-        return jsonify({'msj': 'El vehiculo no existe'}), 404
 
-    return jsonify(one_vehicle.serialize()), 200
-
-
-@app.route('/vehicles', methods=['POST'])
+@api.route('/vehicles', methods=['POST'])
+@query_budget(4)
 def create_vehicle():
     try:
         request_body = request.get_json()
         if not request_body:
             return jsonify({"message": "Solicitud JSON inválida"}), 400
 
-        required_fields = [
-            'name', 'model', 'vehicle_class', 'manufacturer',
-            'cost_in_credits', 'length', 'crew', 'passengers',
-            'max_atmosphering_speed', 'cargo_capacity',
-            'consumables', 'films', 'pilots'
-        ]
+        if isinstance(request_body, list):
+            if len(request_body) > MAX_BULK_ITEMS:
+                return jsonify({"message": f"Se admiten como máximo {MAX_BULK_ITEMS} elementos por solicitud"}), 413
+            results, created = bulk_create(Vehiculos, request_body, VEHICLE_FIELDS, unique_fields=('name', 'model'),
+                                           prepare=prepare_vehicle, list_fields=('films', 'pilots'))
+            if created:
+                response_cache.invalidate('vehicles')
+            return jsonify({"results": results}), 201 if created == len(results) else 207
+
+        required_fields = VEHICLE_FIELDS
         missing_fields = [field for field in required_fields if field not in request_body]
         if missing_fields:
             return jsonify({"message": f"Faltan los campos: {', '.join(missing_fields)}"}), 400
@@ -382,7 +631,11 @@ def create_vehicle():
             pilots=json.dumps(request_body['pilots'])   
         )
         db.session.add(new_vehicle)
+        db.session.flush()
+        index_entity(new_vehicle)
         db.session.commit()
+        response_cache.invalidate('vehicles')
+        entity_cache.invalidate('vehicles', new_vehicle.id)
         return jsonify(new_vehicle.serialize()), 201  
 
     except KeyError as ke:
@@ -392,14 +645,18 @@ def create_vehicle():
         return jsonify({"message": f"Error interno del servidor: {str(e)}"}), 500
 
 
-@app.route('/vehicles/<int:vehicle_id>', methods=['DELETE'])
+@api.route('/vehicles/<int:vehicle_id>', methods=['DELETE'])
+@query_budget(3)
 def delete_vehicle(vehicle_id):
     try:
         existing_vehicle = Vehiculos.query.filter_by(id=vehicle_id).first()
 
         if existing_vehicle:
             db.session.delete(existing_vehicle)
+            remove_entity(Vehiculos, vehicle_id)
             db.session.commit()
+            response_cache.invalidate('vehicles')
+            entity_cache.invalidate('vehicles', vehicle_id)
             return jsonify({"message": "El vehiculo ha sido eliminado"}), 200
 
         return jsonify({"message": "El vehiculo que intenta eliminar no existe"}), 404
@@ -408,41 +665,38 @@ def delete_vehicle(vehicle_id):
         return jsonify({"message": f"Error interno del servidor: {str(e)}"}), 500
 
 
-@app.route('/users/favorites/vehicle/<int:vehicle_id>', methods=['POST'])
+@api.route('/users/favorites/vehicle/<int:vehicle_id>', methods=['POST'])
+@query_budget(3)
 def create_fav_vehicle(vehicle_id):
     try:
-       
+        
         usuario_id = 1
 
-        if not Usuario.query.filter_by(id=usuario_id).first():
-            return jsonify({"message": "El usuario al que le quiere añadir un favorito no existe"}), 404
+        favorito_id = insert_favorite(usuario_id, Vehiculos, vehicle_id)
 
-        if not Vehiculos.query.filter_by(id=vehicle_id).first():
-            return jsonify({"message": "El vehiculo que quiere añadir a favoritos no existe"}), 404
+        if favorito_id is None:
+            db.session.rollback()
+            # Solo en el camino de error averiguamos por que no se inserto
+            if not Usuario.query.filter_by(id=usuario_id).first():
+                return jsonify({"message": "El usuario al que le quiere añadir un favorito no existe"}), 404
 
-        existing_favorito = Favorito.query.filter_by(vehiculos_id=vehicle_id, usuario_id=usuario_id).first()
+            if not Vehiculos.query.filter_by(id=vehicle_id).first():
+                return jsonify({"message": "El vehiculo que quiere añadir a favoritos no existe"}), 404
 
-        if existing_favorito:
-            return jsonify({"message": "El vehiculo ya está en favoritos"}), 409  
+            return jsonify({"message": "El vehiculo ya está en favoritos"}), 409
 
-        new_favorito = Favorito(
-            usuario_id=usuario_id,
-            personajes_id=None,
-            vehiculos_id=vehicle_id,
-            planetas_id=None
-        )
-        db.session.add(new_favorito)
         db.session.commit()
 
-        print(new_favorito.serialize())
-        return jsonify(new_favorito.serialize()), 201  
+        new_favorito = Favorito.query.options(*FAVORITO_EAGER).filter_by(id=favorito_id).first()
+        return jsonify(new_favorito.serialize()), 201 
 
     except Exception as e:
         db.session.rollback()
         return jsonify({"message": f"Error interno del servidor: {str(e)}"}), 500
 
 
-@app.route('/users/favorites/vehicle/<int:vehicle_id>', methods=['DELETE'])
+@api.route('/users/favorites/vehicle/<int:vehicle_id>', methods=['DELETE'])
+@query_budget(3)
 def delete_fav_vehicle(vehicle_id):
     try:
         
@@ -469,12 +723,77 @@ def delete_fav_vehicle(vehicle_id):
 
 """-----------------------------------------------_<Vehicles>_-------------------------------------"""
 
+"""-----------------------------------------------_<Search>_-------------------------------------"""
+
+@api.route('/search', methods=['GET'])
+@query_budget(1)
+def handle_search():
+    q = request.args.get('q', '')
+    if not q.strip():
+        return jsonify({"message": "Falta el parámetro 'q'"}), 400
+    # Sin ninguna palabra (p. ej. q=---) no hay nada que buscar con MATCH
+    if not query_terms(q):
+        return jsonify({"message": "El parámetro 'q' debe contener alguna palabra"}), 400
+
+    limit = parse_int_arg(request.args, 'limit', DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+    after = decode_cursor(request.args['after'], size=3) if request.args.get('after') else None
+    hits, next_cursor = search(q, limit, after)
+
+    return jsonify({'results': hits, 'next': encode_cursor(next_cursor) if next_cursor else None}), 200
+
+"""-----------------------------------------------_<Search>_-------------------------------------"""
+
+"""-----------------------------------------------_<Leaderboard>_-------------------------------------"""
+
+LEADERBOARD_MODELS = {
+    'people': Personajes,
+    'planets': Planetas,
+    'vehicles': Vehiculos,
+}
+LEADERBOARD_SIZE = 10
+
+
+@api.route('/leaderboard/<kind>', methods=['GET'])
+@query_budget(1)
+@replica_reads
+def handle_leaderboard(kind):
+    model = LEADERBOARD_MODELS.get(kind)
+    if model is None:
+        return jsonify({'msj': f"No hay ranking de '{kind}'"}), 404
+
+    limit = parse_int_arg(request.args, 'limit', LEADERBOARD_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+    # Recorrido del indice de favorites_count de mayor a menor; los empates
+    # salen por id descendente, el mismo orden que guarda el indice
+    top = (model.query
+           .with_entities(model.id, model.name, model.favorites_count)
+           .filter(model.favorites_count > 0)
+           .order_by(model.favorites_count.desc(), model.id.desc())
+           .limit(limit)
+           .all())
+
+    return jsonify({'results': [{'id': row.id, 'name': row.name, 'favorites': row.favorites_count}
+                                for row in top]}), 200
+
+"""-----------------------------------------------_<Leaderboard>_-------------------------------------"""
+
 """-----------------------------------------------_<Users>_-------------------------------------"""
 
-@app.route('/users', methods=['GET'])
+@api.route('/users', methods=['GET'])
+@query_budget(2)
+@replica_reads
 def handle_users():
-    all_users = Usuario.query.all()
-    users_list = [u.serialize() for u in all_users]
+    fields = parse_fields(request.args, USUARIO_FIELDS)
+    query = Usuario.query.options(*usuario_options(fields))
+    serialize = serializer(Usuario, fields)
+
+    if wants_stream(request.args):
+        response = stream_json_array(iter_keyset_batches(query, Usuario.id), serialize)
+        if response is None:
+            return jsonify({'msj': 'no hay usuarios'}), 404
+        return response
+
+    all_users = query.all()
+    users_list = [serialize(u) for u in all_users]
 
     if not users_list:
         return jsonify({'msj': 'no hay usuarios'}), 404
@@ -482,14 +801,28 @@ def handle_users():
     return jsonify(users_list), 200
 
 
-@app.route('/users/favorites', methods=['GET'])
+@api.route('/users/favorites', methods=['GET'])
+@query_budget(1)
+@replica_reads
 def handle_user_favorites():
     
     usuario_id = 1
 
-    all_favorites = Favorito.query.filter_by(usuario_id=usuario_id).all()
-    favorites_list = [f.serialize() for f in all_favorites]
-    print(favorites_list)
+    view = request.args.get('view', 'full')
+    if view not in ('full', 'ids'):
+        return jsonify({"message": "El parámetro 'view' debe ser 'full' o 'ids'"}), 400
+
+    if view == 'ids':
+        # Solo los ids por tipo, para clientes que ya tienen el catalogo
+        rows = db.session.execute(favorite_ids_query(usuario_id)).all()
+        if not rows:
+            return jsonify({'msj': 'no hay favoritos'}), 404
+        return jsonify(group_favorite_ids(rows)), 200
+
+    fields = parse_fields(request.args, FAVORITO_FIELDS)
+    serialize = serializer(Favorito, fields)
+    all_favorites = Favorito.query.options(*favorito_options(fields)).filter_by(usuario_id=usuario_id).all()
+    favorites_list = [serialize(f) for f in all_favorites]
 
     if not favorites_list:
         return jsonify({'msj': 'no hay favoritos'}), 404
@@ -497,10 +830,45 @@ def handle_user_favorites():
     return jsonify({'results': favorites_list}), 200
 
 
-@app.route('/favorites', methods=['GET'])
+@api.route('/users/favorites/batch', methods=['POST'])
+@query_budget(13)
+def batch_favorites():
+    try:
+
+        usuario_id = 1
+
+        batch = parse_batch(request.get_json(silent=True))
+
+        if not Usuario.query.filter_by(id=usuario_id).first():
+            return jsonify({"message": "El usuario no existe"}), 404
+
+        result = apply_batch(usuario_id, batch)
+        db.session.commit()
+        return jsonify(result), 200
+
+    except APIException:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Error interno del servidor: {str(e)}"}), 500
+
+
+@api.route('/favorites', methods=['GET'])
+@query_budget(1)
+@replica_reads
 def handle_favorites():
-    all_favorites = Favorito.query.all()
-    favorites_list = [f.serialize() for f in all_favorites]
+    fields = parse_fields(request.args, FAVORITO_FIELDS)
+    query = Favorito.query.options(*favorito_options(fields))
+    serialize = serializer(Favorito, fields)
+
+    if wants_stream(request.args):
+        response = stream_json_array(iter_keyset_batches(query, Favorito.id), serialize)
+        if response is None:
+            return jsonify({'msj': 'no hay favoritos'}), 404
+        return response
+
+    all_favorites = query.all()
+    favorites_list = [serialize(f) for f in all_favorites]
 
     if not favorites_list:
         return jsonify({'msj': 'no hay favoritos'}), 404
@@ -512,7 +880,29 @@ def handle_favorites():
 
     # Endpoints FINAL
 
-@app.route('/user', methods=['GET'])
+@api.route('/internal/pool', methods=['GET'])
+@query_budget(0)
+def handle_pool_stats():
+    # Estado del pool de conexiones de este worker
+    return jsonify(pool_stats.to_dict(db.engine)), 200
+
+
+@api.route('/internal/entity-cache', methods=['GET'])
+@query_budget(0)
+def handle_entity_cache_stats():
+    # Aciertos, fallos y expulsiones del cache de entidades de este worker
+    return jsonify(entity_cache.to_dict()), 200
+
+
+@api.route('/internal/replica', methods=['GET'])
+@query_budget(0)
+def handle_replica_stats():
+    # Salud y retraso de la replica segun este worker
+    return jsonify(replica_router.to_dict()), 200
+
+
+@api.route('/user', methods=['GET'])
+@query_budget(0)
 def handle_hello():
     response_body = {
         "msg": "Hello, this is your GET /user response"
@@ -523,4 +913,4 @@ def handle_hello():
 # This only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
-    app.run(host='0.0.0.0', port=PORT, debug=False)
+    create_app().run(host='0.0.0.0', port=PORT, debug=False)
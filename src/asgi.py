@@ -0,0 +1,252 @@
+# Entrada ASGI, alternativa a wsgi.py:
+#   uvicorn asgi:application --app-dir src/
+# Las rutas de lectura se atienden con handlers async sobre un engine async de
+# SQLAlchemy (aiosqlite o asyncpg); el resto de rutas (escrituras, admin,
+# busqueda, modo streaming) se delegan a la app Flask de siempre. Los cuerpos
+# se generan con el mismo proveedor JSON de Flask, asi que son identicos byte a
+# byte a los del modo WSGI y ambos modos se pueden comparar directamente.
+# Los handlers async se ejecutan dentro de un contexto de peticion de Flask con
+# sus hooks before/after_request (metricas, CORS, compresion, control de
+# consultas, replica) y el mismo cache de respuestas; solo la vista es async.
+
+import io
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask import g, request
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from werkzeug.exceptions import HTTPException
+
+from app import create_app, favorito_options, usuario_options, FAVORITO_FIELDS, USUARIO_FIELDS
+from filters import parse_filters, parse_sort
+from metrics import attach_engine
+from pool import engine_options_from_env
+from replica import REPLICA_BIND
+from tracker import attach_tracker
+from favorites import favorite_ids_query, group_favorite_ids
+from models import Personajes, Planetas, Vehiculos, Favorito, Usuario
+from encoding import row_encoder, json_page
+from serializers import serializer, column_fields
+from utils import (parse_page_args, keyset_query, keyset_result, parse_fields,
+                   project_columns, encode_cursor, wants_stream)
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def async_database_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+def create_engine(url):
+    engine = create_async_engine(async_database_url(url), **engine_options_from_env(url, instrument=False))
+    attach_engine(engine.sync_engine)
+    attach_tracker(engine.sync_engine)
+    return engine
+
+
+app = create_app()
+engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+# Las rutas con @replica_reads leen de la replica cuando ReplicaRouter lo decide
+replica_engine = None
+if REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+    replica_engine = create_engine(app.config['SQLALCHEMY_BINDS'][REPLICA_BIND]['url'])
+    app.extensions['replica_router'].watch(replica_engine.sync_engine)
+wsgi_application = WsgiToAsgi(app)
+
+
+async def fetch(session, statement, entities):
+    result = await session.execute(statement)
+    return result.scalars().all() if entities else result.all()
+
+
+async def catalog_list(session, args, model, empty_message):
+    # Version async de app.catalog_list
+    fields = parse_fields(args, column_fields(model))
+    sort = parse_sort(args, model)
+    filters = parse_filters(args, model)
+    fields = fields or column_fields(model)
+    columns = project_columns(model, fields, extra=[sort[0]] if sort else ())
+    statement = select(*columns).filter(*filters)
+    encode = row_encoder(columns, fields, app.json)
+
+    limit, after = parse_page_args(args, sort)
+    rows = await fetch(session, keyset_query(statement, model.id, limit, after, sort), False)
+    page, next_cursor = keyset_result(rows, model.id, limit, sort)
+
+    if not page and after is None and not filters:
+        return {'msj': empty_message}, 404
+
+    if sort is not None and next_cursor is not None:
+        next_cursor = encode_cursor(next_cursor)
+    return json_page(encode, page, next_cursor), 200
+
+
+async def catalog_detail(session, args, model, resource, entity_id, missing_message):
+    # Version async de app.catalog_detail, con el mismo entity_cache
+    requested = parse_fields(args, column_fields(model))
+    entity_cache = app.extensions['entity_cache']
+    body, generation = entity_cache.lookup(resource, entity_id, requested)
+    if body is None:
+        fields = requested or column_fields(model)
+        columns = project_columns(model, fields)
+        encode = row_encoder(columns, fields, app.json)
+
+        rows = await fetch(session, select(*columns).filter(model.id == entity_id).limit(1), False)
+        if not rows:
+            return {'msj': missing_message}, 404
+        body = encode(rows[0])
+        entity_cache.store(resource, entity_id, requested, body, generation)
+    return body + '\n', 200
+
+
+async def handle_users(session, args):
+    fields = parse_fields(args, USUARIO_FIELDS)
+    serialize = serializer(Usuario, fields)
+    users = await fetch(session, select(Usuario).options(*usuario_options(fields)), True)
+    users_list = [serialize(u) for u in users]
+
+    if not users_list:
+        return {'msj': 'no hay usuarios'}, 404
+    return users_list, 200
+
+
+async def handle_user_favorites(session, args):
+    usuario_id = 1
+
+    view = args.get('view', 'full')
+    if view not in ('full', 'ids'):
+        return {'message': "El parámetro 'view' debe ser 'full' o 'ids'"}, 400
+    if view == 'ids':
+        rows = await fetch(session, favorite_ids_query(usuario_id), False)
+        if not rows:
+            return {'msj': 'no hay favoritos'}, 404
+        return group_favorite_ids(rows), 200
+
+    fields = parse_fields(args, FAVORITO_FIELDS)
+    serialize = serializer(Favorito, fields)
+    statement = select(Favorito).options(*favorito_options(fields)).filter_by(usuario_id=usuario_id)
+    favorites_list = [serialize(f) for f in await fetch(session, statement, True)]
+
+    if not favorites_list:
+        return {'msj': 'no hay favoritos'}, 404
+    return {'results': favorites_list}, 200
+
+
+async def handle_favorites(session, args):
+    fields = parse_fields(args, FAVORITO_FIELDS)
+    serialize = serializer(Favorito, fields)
+    statement = select(Favorito).options(*favorito_options(fields))
+    favorites_list = [serialize(f) for f in await fetch(session, statement, True)]
+
+    if not favorites_list:
+        return {'msj': 'no hay favoritos'}, 404
+    return favorites_list, 200
+
+
+# endpoint de Flask -> handler async. El modo streaming (?stream=1) se delega
+# en la app Flask.
+ASYNC_VIEWS = {
+    'api.handle_people': lambda s, a: catalog_list(s, a, Personajes, 'no hay personajes'),
+    'api.handle_planets': lambda s, a: catalog_list(s, a, Planetas, 'no hay planetas'),
+    'api.handle_vehicles': lambda s, a: catalog_list(s, a, Vehiculos, 'no hay vehiculos'),
+    'api.handle_people_id': lambda s, a, people_id: catalog_detail(
+        s, a, Personajes, 'people', people_id, 'El personaje no existe'),
+    'api.handle_planet_id': lambda s, a, planet_id: catalog_detail(
+        s, a, Planetas, 'planets', planet_id, 'El planeta no existe'),
+    'api.handle_vehicle_id': lambda s, a, vehicle_id: catalog_detail(
+        s, a, Vehiculos, 'vehicles', vehicle_id, 'El vehiculo no existe'),
+    'api.handle_users': handle_users,
+    'api.handle_user_favorites': handle_user_favorites,
+    'api.handle_favorites': handle_favorites,
+}
+
+
+def match_view(scope):
+    # Se usa el url_map de Flask para que ambos modos expongan las mismas rutas
+    adapter = app.url_map.bind('localhost')
+    try:
+        rule, view_args = adapter.match(scope['path'], scope['method'], return_rule=True)
+    except HTTPException:
+        return None, None
+    return ASYNC_VIEWS.get(rule.endpoint), view_args
+
+
+def wsgi_environ(scope):
+    # Entorno WSGI de una peticion ASGI sin cuerpo, para el contexto de Flask
+    instance = WsgiToAsgiInstance(app)
+    instance.scope = scope
+    return instance.build_environ(scope, io.BytesIO())
+
+
+def make_view_response(result):
+    body, status = result
+    # Los listados del catalogo ya llegan codificados (str)
+    if isinstance(body, str):
+        response = app.response_class(body, mimetype=app.json.mimetype)
+    else:
+        response = app.json.response(body)
+    response.status_code = status
+    return response
+
+
+async def call_view(view, view_args):
+    # Los APIException los convierte en respuesta el errorhandler de la app
+    async with AsyncSession(replica_engine if g.get('db_replica') else engine) as session:
+        return make_view_response(await view(session, request.args, **view_args))
+
+
+async def dispatch(view, view_args):
+    # Como Flask.full_dispatch_request, con la vista async en medio
+    try:
+        response = app.preprocess_request()
+        if response is None:
+            resource = getattr(app.view_functions[request.endpoint], 'cached_resource', None)
+            response_cache = app.extensions['response_cache']
+            if resource is None or response_cache.backend is None:
+                response = await call_view(view, view_args)
+            else:
+                response, key = response_cache.lookup(resource)
+                if response is None:
+                    response = response_cache.store(key, await call_view(view, view_args))
+    except Exception as error:
+        response = app.handle_user_exception(error)
+    return app.finalize_request(response)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            if replica_engine is not None:
+                await replica_engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    view, view_args = match_view(scope) if scope['type'] == 'http' else (None, None)
+    environ = wsgi_environ(scope) if view is not None else None
+    if view is None or wants_stream(app.request_class(environ).args):
+        return await wsgi_application(scope, receive, send)
+
+    with app.request_context(environ):
+        try:
+            response = await dispatch(view, view_args)
+        except Exception as error:
+            response = app.handle_exception(error)
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': response.get_data()})
@@ -0,0 +1,75 @@
+from sqlalchemy import insert, select
+from models import db
+from search import index_rows
+from tracker import set_query_budget
+
+MAX_BULK_ITEMS = 5000
+# Consultas del alta masiva: una por campo unico (como mucho 2), los lotes del
+# INSERT (SQLAlchemy manda 1000 filas por sentencia: 5 con MAX_BULK_ITEMS) y
+# el INSERT del indice de busqueda
+BULK_QUERY_BUDGET = 2 + 5 + 1
+
+
+def is_scalar(value):
+    # null, listas y objetos no se pueden guardar ni deduplicar; bool es un int
+    # para Python pero no es un valor valido para estas columnas
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+def bulk_create(model, items, required_fields, unique_fields=('name',), prepare=None, list_fields=()):
+    # Alta masiva en una sola transaccion: valida todo antes de escribir,
+    # detecta colisiones con una consulta IN por campo unico e inserta con un
+    # solo executemany. Devuelve el estado de cada elemento y cuantos se crearon.
+    set_query_budget(BULK_QUERY_BUDGET)
+    results = [None] * len(items)
+    pending = []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {"index": index, "status": 400, "message": "Elemento JSON inválido"}
+            continue
+        missing_fields = [field for field in required_fields if field not in item]
+        if missing_fields:
+            results[index] = {"index": index, "status": 400,
+                              "message": f"Faltan los campos: {', '.join(missing_fields)}"}
+            continue
+        # list_fields son listas que prepare serializa (films y pilots en vehiculos)
+        invalid_fields = [field for field in required_fields
+                          if not (isinstance(item[field], list) if field in list_fields else is_scalar(item[field]))]
+        if invalid_fields:
+            results[index] = {"index": index, "status": 400,
+                              "message": f"Valores no válidos en los campos: {', '.join(invalid_fields)}"}
+            continue
+        row = {field: item[field] for field in required_fields}
+        pending.append((index, prepare(row) if prepare else row))
+
+    for field in unique_fields:
+        column = getattr(model, field)
+        values = {row[field] for _, row in pending}
+        taken = set(db.session.scalars(select(column).where(column.in_(values)))) if values else set()
+        accepted = []
+        for index, row in pending:
+            if row[field] in taken:
+                results[index] = {"index": index, "status": 409,
+                                  "message": f"Ya existe un registro con {field} '{row[field]}'"}
+                continue
+            # Tambien evita duplicados dentro del mismo lote
+            taken.add(row[field])
+            accepted.append((index, row))
+        pending = accepted
+
+    if pending:
+        # Sin sort_by_parameter_order: en SQLite obligaria a un INSERT por fila.
+        # RETURNING no garantiza el orden, asi que los ids se asignan por el
+        # nombre, que es unico.
+        inserted = db.session.execute(
+            insert(model).returning(model.id, model.name),
+            [row for _, row in pending]
+        ).all()
+        ids = {name: new_id for new_id, name in inserted}
+        index_rows(model, [dict(row, id=ids[row['name']]) for _, row in pending])
+        db.session.commit()
+        for index, row in pending:
+            results[index] = {"index": index, "status": 201, "id": ids[row['name']]}
+
+    return results, len(pending)
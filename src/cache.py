@@ -0,0 +1,213 @@
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, current_app, make_response, request
+from werkzeug.local import LocalProxy
+from compression import compression
+from channel import channel_from_env, decode_message, encode_message, worker_count
+
+logger = logging.getLogger(__name__)
+
+
+class LRUBackend:
+    # Cache en memoria del proceso. Expone get/set/incr, la misma interfaz
+    # que SharedBackend espera de su cliente, asi que tambien sirve como
+    # sustituto local de un cache compartido.
+    shared = False
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        # ttl en segundos, como el ex= de redis; None no caduca
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def incr(self, key):
+        # Los contadores de version no se expulsan nunca: si se perdieran
+        # podrian reaparecer entradas de una version ya invalidada.
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def version(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+
+class SharedBackend:
+    # Adaptador para un cache compartido entre workers de gunicorn. El cliente
+    # debe ofrecer get(key), set(key, value, ex=ttl) e incr(key), como redis.Redis.
+    shared = True
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def version(self, key):
+        value = self.client.get(key)
+        return int(value) if value is not None else 0
+
+
+def backend_from_env(shared_channel=False):
+    # RESPONSE_CACHE_BACKEND=lru | redis | none. Sin definir se usa lru con un
+    # solo proceso o con un canal de invalidacion compartido (redis), y
+    # ninguno con varios workers y el canal local: las invalidaciones del LRU
+    # solo llegarian al worker que atiende la escritura, y los demas servirian
+    # datos antiguos hasta RESPONSE_CACHE_TTL.
+    kind = os.getenv('RESPONSE_CACHE_BACKEND')
+    if kind is None:
+        kind = 'lru' if worker_count() <= 1 or shared_channel else 'none'
+    kind = kind.lower()
+    if kind == 'none':
+        return None
+    if kind == 'redis':
+        import redis
+        return SharedBackend(redis.Redis.from_url(os.getenv('RESPONSE_CACHE_URL', 'redis://localhost:6379/0')))
+    if worker_count() > 1 and not shared_channel:
+        logger.warning('RESPONSE_CACHE_BACKEND=lru con %s workers: cada worker invalida solo su cache', worker_count())
+    return LRUBackend(int(os.getenv('RESPONSE_CACHE_SIZE', 1024)))
+
+
+class ResponseCache:
+    # Cache de respuestas GET por recurso. Cada recurso tiene un numero de
+    # version que forma parte de la clave; invalidar es incrementar la version,
+    # de modo que las entradas viejas dejan de leerse y caducan solas.
+    # Con un backend por proceso (LRU) las invalidaciones se publican en el
+    # canal de channel.py para que el resto de workers suba su version.
+    def __init__(self, app=None, backend=None, channel=None):
+        self.backend = backend
+        self.channel = channel
+        self.ttl = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.channel is None:
+            self.channel = app.config.get('ENTITY_CACHE_CHANNEL') or channel_from_env()
+        if self.backend is None:
+            self.backend = app.config.get('RESPONSE_CACHE_BACKEND') or backend_from_env(self.channel.shared)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', int(os.getenv('RESPONSE_CACHE_TTL', 300)))
+        self.channel.subscribe(self._receive)
+        app.extensions['response_cache'] = self
+
+    def _key(self, resource, path):
+        version = self.backend.version(f'version:{resource}')
+        return f'resp:{resource}:{version}:{path}'
+
+    def invalidate(self, resource):
+        if self.backend is None:
+            return
+        self.backend.incr(f'version:{resource}')
+        if not self.backend.shared:
+            self.channel.publish(encode_message('response', resource))
+
+    def _receive(self, message):
+        decoded = decode_message(message)
+        if decoded is not None and decoded[0] == 'response' and self.backend is not None and not self.backend.shared:
+            self.backend.incr(f'version:{decoded[1]}')
+
+    def _load(self, key):
+        raw = self.backend.get(key)
+        if raw is None:
+            return None
+        etag, mimetype, body = raw.split(b'\n', 2)
+        return etag.decode(), mimetype.decode(), body
+
+    def _store(self, key, etag, mimetype, body):
+        self.backend.set(key, b'\n'.join([etag.encode(), mimetype.encode(), body]), self.ttl)
+
+    def _variant(self, key, encoding, body):
+        # Cuerpo comprimido guardado junto al original (misma version en la
+        # clave), para comprimir una vez por entrada y no en cada acierto
+        variant_key = f'{key}:{encoding}'
+        compressed = self.backend.get(variant_key)
+        if compressed is None:
+            compressed = compression.compress(body, encoding)
+            self.backend.set(variant_key, compressed, self.ttl)
+        return compressed
+
+    def _compressed(self, response, key, body):
+        encoding = compression.negotiate(request.headers.get('Accept-Encoding'), len(body), response.mimetype)
+        if encoding is not None:
+            compression.apply(response, encoding, self._variant(key, encoding, body))
+        elif compression.encodings:
+            response.vary.add('Accept-Encoding')
+        return response
+
+    def lookup(self, resource):
+        # (respuesta guardada o None, clave con la que guardar la nueva)
+        if hasattr(self.channel, 'listen'):
+            self.channel.listen()
+        key = self._key(resource, request.full_path)
+        entry = self._load(key)
+        if entry is None:
+            return None, key
+        etag, mimetype, body = entry
+        response = Response(body, 200, mimetype=mimetype)
+        response.set_etag(etag)
+        return self._compressed(response, key, body).make_conditional(request), key
+
+    def store(self, key, response):
+        if response.status_code == 200 and not response.is_streamed:
+            body = response.get_data()
+            etag = hashlib.sha1(body).hexdigest()
+            self._store(key, etag, response.mimetype, body)
+            response.set_etag(etag)
+            self._compressed(response, key, body).make_conditional(request)
+        return response
+
+    def respond(self, resource, view, args, kwargs):
+        if self.backend is None:
+            return view(*args, **kwargs)
+        response, key = self.lookup(resource)
+        if response is None:
+            response = self.store(key, make_response(view(*args, **kwargs)))
+        return response
+
+
+def cached(resource):
+    # Decorador de rutas GET. Cada app tiene su propio ResponseCache (ver
+    # create_app), asi que se busca el de la app que atiende la peticion.
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            return current_app.extensions['response_cache'].respond(resource, view, args, kwargs)
+        # Para las vistas async de asgi.py, que usan el mismo cache
+        wrapper.cached_resource = resource
+        return wrapper
+    return decorator
+
+
+# ResponseCache de la app actual
+response_cache = LocalProxy(lambda: current_app.extensions['response_cache'])
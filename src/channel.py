@@ -0,0 +1,97 @@
+import os
+import socket
+import threading
+
+# Canal de invalidaciones de los caches de cada worker (ResponseCache y
+# EntityCache). Cada escritura publica que recurso o entidad ha cambiado y
+# todos los workers suscritos lo descartan de su memoria:
+#   ENTITY_CACHE_CHANNEL=local  solo este proceso (por defecto)
+#   ENTITY_CACHE_CHANNEL=redis  pub/sub de redis en ENTITY_CACHE_URL
+# Con varios workers y el canal local cada worker solo se entera de sus
+# propias escrituras, asi que los caches en memoria se desactivan salvo que
+# se configuren expresamente (ver cache.backend_from_env y EntityCache).
+
+
+def worker_count():
+    # gunicorn usa WEB_CONCURRENCY como numero de workers y
+    # config/gunicorn_profiles.py lo exporta con el valor que aplica
+    try:
+        return int(os.getenv('WEB_CONCURRENCY', 1))
+    except ValueError:
+        return 1
+
+
+def process_origin():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def encode_message(cache, resource, entity_id=None):
+    # "origen|cache|recurso|id"; sin id se invalida el recurso entero
+    return f"{process_origin()}|{cache}|{resource}|{'' if entity_id is None else entity_id}"
+
+
+def decode_message(message):
+    # (cache, recurso, id) o None si el mensaje lo publico este mismo proceso,
+    # que ya se invalido al publicarlo
+    origin, cache, resource, entity_id = message.split('|')
+    if origin == process_origin():
+        return None
+    return cache, resource, int(entity_id) if entity_id else None
+
+
+class LocalChannel:
+    # Entrega los mensajes a los suscriptores del mismo proceso; sirve para
+    # un solo proceso.
+    shared = False
+
+    def __init__(self):
+        self.subscribers = []
+
+    def publish(self, message):
+        for callback in self.subscribers:
+            callback(message)
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+
+class RedisChannel:
+    # Pub/sub de redis. La escucha es un hilo por proceso que se arranca en el
+    # primer uso, porque los hilos no sobreviven al fork de gunicorn --preload.
+    shared = True
+
+    def __init__(self, client, name='cache-invalidation'):
+        self.client = client
+        self.name = name
+        self.subscribers = []
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+    def publish(self, message):
+        self.client.publish(self.name, message)
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def _deliver(self, message):
+        data = message['data']
+        for callback in self.subscribers:
+            callback(data.decode() if isinstance(data, bytes) else data)
+
+    def listen(self):
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid != os.getpid():
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{self.name: self._deliver})
+                pubsub.run_in_thread(sleep_time=1, daemon=True)
+                self._listener_pid = os.getpid()
+
+
+def channel_from_env():
+    kind = os.getenv('ENTITY_CACHE_CHANNEL', 'local').lower()
+    if kind == 'redis':
+        import redis
+        return RedisChannel(redis.Redis.from_url(os.getenv('ENTITY_CACHE_URL', 'redis://localhost:6379/0')))
+    return LocalChannel()
@@ -0,0 +1,131 @@
+import gzip
+import os
+from flask import current_app, request
+from werkzeug.local import LocalProxy
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compresion de respuestas negociada con Accept-Encoding:
+#   COMPRESSION_ENCODINGS  orden de preferencia del servidor (zstd,br,gzip);
+#                          vacio la desactiva. br y zstd solo si estan
+#                          instalados brotli y zstandard.
+#   COMPRESSION_MIN_SIZE   bytes a partir de los que se comprime (1024)
+#   COMPRESSION_GZIP_LEVEL / COMPRESSION_BR_LEVEL / COMPRESSION_ZSTD_LEVEL
+#                          nivel de cada algoritmo (6 / 4 / 3)
+# Las respuestas que pasan por ResponseCache guardan sus variantes
+# comprimidas junto al cuerpo, asi que un acierto no vuelve a comprimir.
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+
+DEFAULT_LEVELS = {'gzip': 6, 'br': 4, 'zstd': 3}
+
+
+def compress_gzip(body, level):
+    # mtime=0: la misma entrada da siempre los mismos bytes
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def compress_br(body, level):
+    return brotli.compress(body, quality=level)
+
+
+def compress_zstd(body, level):
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+COMPRESSORS = {'gzip': compress_gzip}
+if brotli is not None:
+    COMPRESSORS['br'] = compress_br
+if zstandard is not None:
+    COMPRESSORS['zstd'] = compress_zstd
+
+
+def parse_accept_encoding(header):
+    # {codificacion: q}; los parametros distintos de q se ignoran
+    accepted = {}
+    for item in (header or '').split(','):
+        name, _, params = item.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+class Compression:
+    def __init__(self, app=None):
+        self.encodings = []
+        self.min_size = 1024
+        self.levels = dict(DEFAULT_LEVELS)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        names = app.config.get('COMPRESSION_ENCODINGS', os.getenv('COMPRESSION_ENCODINGS', 'zstd,br,gzip'))
+        self.encodings = [name.strip() for name in names.split(',') if name.strip() in COMPRESSORS]
+        self.min_size = int(app.config.get('COMPRESSION_MIN_SIZE', os.getenv('COMPRESSION_MIN_SIZE', 1024)))
+        for name, default in DEFAULT_LEVELS.items():
+            key = f'COMPRESSION_{name.upper()}_LEVEL'
+            self.levels[name] = int(app.config.get(key, os.getenv(key, default)))
+        app.extensions['compression'] = self
+        app.after_request(self.after_request)
+
+    def negotiate(self, accept_encoding, size, mimetype):
+        # Codificacion a usar o None: preferencia del servidor entre las que
+        # el cliente acepta con q > 0 (o cubre con *)
+        if size < self.min_size or mimetype not in COMPRESSIBLE_MIMETYPES or not accept_encoding:
+            return None
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get('*', 0.0)
+        for name in self.encodings:
+            if accepted.get(name, wildcard) > 0:
+                return name
+        return None
+
+    def compress(self, body, encoding):
+        return COMPRESSORS[encoding](body, self.levels[encoding])
+
+    def apply(self, response, encoding, body):
+        # Sustituye el cuerpo por su version comprimida. El ETag pasa a ser
+        # debil: sigue valiendo para If-None-Match con cualquier codificacion.
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def process(self, response, accept_encoding):
+        if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+                or not 200 <= response.status_code < 300 or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(accept_encoding, response.calculate_content_length() or 0, response.mimetype)
+        if encoding is None:
+            return response
+        return self.apply(response, encoding, self.compress(response.get_data(), encoding))
+
+    def after_request(self, response):
+        if not self.encodings:
+            return response
+        return self.process(response, request.headers.get('Accept-Encoding'))
+
+
+# Compression de la app actual
+compression = LocalProxy(lambda: current_app.extensions['compression'])
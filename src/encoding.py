@@ -0,0 +1,114 @@
+import functools
+import math
+import os
+from decimal import Decimal
+from json.encoder import encode_basestring, encode_basestring_ascii
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Codificacion JSON de las respuestas.
+#  - OrjsonProvider sustituye al proveedor por defecto de Flask cuando orjson
+#    esta instalado (JSON_PROVIDER=default lo desactiva). Mantiene las claves
+#    ordenadas y el formato compacto, asi que solo cambia el escape de los
+#    caracteres no ASCII, que se emiten tal cual en UTF-8.
+#  - RowEncoder escribe filas de resultados SQL (tuplas) directamente como
+#    objetos JSON, sin crear entidades del ORM ni diccionarios intermedios.
+
+
+def default(o):
+    # Los mismos tipos extra que admite el proveedor por defecto de Flask
+    if isinstance(o, Decimal):
+        return str(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+class OrjsonProvider(JSONProvider):
+    ensure_ascii = False
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=default, option=orjson.OPT_SORT_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE
+        if self._app.debug:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(orjson.dumps(obj, default=default, option=option), mimetype=self.mimetype)
+
+
+def init_json(app):
+    choice = app.config.get('JSON_PROVIDER', os.getenv('JSON_PROVIDER', 'orjson')).lower()
+    if choice == 'orjson' and orjson is not None:
+        app.json = OrjsonProvider(app)
+    elif not isinstance(app.json, DefaultJSONProvider):
+        app.json = DefaultJSONProvider(app)
+
+
+def scalar_encoders(provider):
+    # Codificador por tipo de valor, coherente con el escape del proveedor
+    escape = encode_basestring_ascii if getattr(provider, 'ensure_ascii', True) else encode_basestring
+    return {
+        str: escape,
+        int: int.__repr__,
+        float: lambda v: float.__repr__(v) if math.isfinite(v) else provider.dumps(v),
+        bool: lambda v: 'true' if v else 'false',
+        type(None): lambda v: 'null',
+    }
+
+
+class RowEncoder:
+    # Codifica filas como objetos JSON con las claves ordenadas, igual que
+    # jsonify. names[i] es la clave del valor que esta en row[positions[i]];
+    # la plantilla se prepara una vez por conjunto de campos.
+    def __init__(self, names, positions, provider):
+        pairs = sorted(zip(names, positions))
+        escape = scalar_encoders(provider)[str]
+        self.order = [position for _, position in pairs]
+        self.template = '{' + ','.join(escape(name).replace('%', '%%') + ':%s' for name, _ in pairs) + '}'
+        self.encoders = scalar_encoders(provider)
+        self.fallback = provider.dumps
+
+    def value(self, v):
+        encode = self.encoders.get(type(v))
+        return encode(v) if encode is not None else self.fallback(v)
+
+    def __call__(self, row):
+        value = self.value
+        return self.template % tuple([value(row[i]) for i in self.order])
+
+    def array(self, rows):
+        return '[' + ','.join([self(row) for row in rows]) + ']'
+
+
+def row_encoder(columns, fields, provider):
+    # Encoder para filas de select(*columns) que emite solo `fields`
+    return cached_row_encoder(tuple(column.key for column in columns), tuple(fields), provider)
+
+
+@functools.lru_cache(maxsize=256)
+def cached_row_encoder(keys, fields, provider):
+    # Una plantilla por conjunto de campos: ?fields= acota las combinaciones
+    return RowEncoder(fields, [keys.index(field) for field in fields], provider)
+
+
+def json_page(encode, rows, next_cursor):
+    # Cuerpo de {'results': [...], 'next': ...} tal y como lo escribiria jsonify
+    return '{"next":%s,"results":%s}\n' % (encode.value(next_cursor), encode.array(rows))
+
+
+def json_response(body, status=200):
+    # Respuesta con un cuerpo ya codificado (RowEncoder/json_page)
+    if not body.endswith('\n'):
+        body += '\n'
+    return current_app.response_class(body, status, mimetype=current_app.json.mimetype)
@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from werkzeug.local import LocalProxy
+from channel import channel_from_env, decode_message, encode_message, worker_count
+
+logger = logging.getLogger(__name__)
+
+# Cache de entidades sueltas (GET /people/<id> y similares) en la memoria de
+# cada worker. Guarda el cuerpo JSON ya codificado por (recurso, id, campos),
+# con un tamano maximo (LRU) y una caducidad (TTL).
+# A diferencia de ResponseCache, que invalida un recurso entero, aqui se
+# invalida solo la entidad que cambia, asi que dar de alta un personaje no
+# expulsa a Luke. Las invalidaciones se difunden al resto de workers por el
+# canal de channel.py, el mismo que usa ResponseCache.
+
+
+class EntityCache:
+    def __init__(self, app=None, channel=None):
+        self.channel = channel
+        self.maxsize = 0
+        self.ttl = 0
+        self._data = OrderedDict()
+        self._keys = {}
+        self._lock = threading.Lock()
+        # Cada invalidacion incrementa la generacion: un set() que empezo a
+        # leer de la base de datos antes de una invalidacion no se guarda
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.channel is None:
+            self.channel = app.config.get('ENTITY_CACHE_CHANNEL') or channel_from_env()
+        # Con varios workers y un canal que no los alcanza a todos, una
+        # entidad borrada seguiria saliendo de la memoria de los demas
+        default_size = 1024 if worker_count() <= 1 or self.channel.shared else 0
+        self.maxsize = app.config.get('ENTITY_CACHE_SIZE', int(os.getenv('ENTITY_CACHE_SIZE', default_size)))
+        self.ttl = app.config.get('ENTITY_CACHE_TTL', int(os.getenv('ENTITY_CACHE_TTL', 60)))
+        if self.maxsize > 0 and worker_count() > 1 and not self.channel.shared:
+            logger.warning('cache de entidades con %s workers y canal local: cada worker invalida solo su cache',
+                           worker_count())
+        self.channel.subscribe(self._receive)
+        app.extensions['entity_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0 and self.ttl > 0
+
+    def lookup(self, resource, entity_id, fields):
+        # (cuerpo o None, generacion con la que guardar el resultado)
+        if not self.enabled:
+            return None, None
+        if hasattr(self.channel, 'listen'):
+            self.channel.listen()
+        key = (resource, entity_id, tuple(fields) if fields else None)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= now:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None, self._generation
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1], self._generation
+
+    def store(self, resource, entity_id, fields, body, generation):
+        if not self.enabled or generation is None:
+            return
+        key = (resource, entity_id, tuple(fields) if fields else None)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, body)
+            self._data.move_to_end(key)
+            self._keys.setdefault((resource, entity_id), set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        del self._data[key]
+        variants = self._keys[key[:2]]
+        variants.discard(key)
+        if not variants:
+            del self._keys[key[:2]]
+
+    def _discard(self, resource, entity_id=None):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if entity_id is None:
+                keys = [key for key in self._data if key[0] == resource]
+            else:
+                keys = list(self._keys.get((resource, entity_id), ()))
+            for key in keys:
+                self._remove(key)
+
+    def invalidate(self, resource, entity_id=None):
+        # Sin entity_id se invalida el recurso entero (p. ej. tras una carga masiva)
+        self._discard(resource, entity_id)
+        if self.channel is not None:
+            self.channel.publish(encode_message('entity', resource, entity_id))
+
+    def _receive(self, message):
+        decoded = decode_message(message)
+        if decoded is not None and decoded[0] == 'entity':
+            self._discard(*decoded[1:])
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+            self._keys.clear()
+
+    def to_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'pid': os.getpid(),
+                'channel': type(self.channel).__name__,
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+# EntityCache de la app actual
+entity_cache = LocalProxy(lambda: current_app.extensions['entity_cache'])
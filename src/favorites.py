@@ -0,0 +1,278 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, event, func, inspect, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from utils import APIException
+from models import db, Favorito, Usuario, Personajes, Planetas, Vehiculos
+
+FAVORITE_COLUMNS = {
+    Personajes: 'personajes_id',
+    Planetas: 'planetas_id',
+    Vehiculos: 'vehiculos_id',
+}
+
+DIALECT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def insert_favorite(usuario_id, model, entity_id):
+    # Alta de favorito en una sola sentencia:
+    #   INSERT INTO favorito (usuario_id, <col>)
+    #   SELECT usuario.id, <entidad>.id FROM usuario JOIN <entidad> ... WHERE ...
+    #   ON CONFLICT DO NOTHING RETURNING id
+    # El SELECT hace de comprobacion de claves foraneas y el indice unico
+    # resuelve los duplicados concurrentes. Devuelve el id nuevo o None si no
+    # se inserto nada (usuario o entidad inexistente, o favorito repetido).
+    column = FAVORITE_COLUMNS[model]
+    source = (
+        select(Usuario.id, model.id)
+        .join_from(Usuario, model, model.id == entity_id)
+        .where(Usuario.id == usuario_id)
+    )
+
+    dialect_insert = DIALECT_INSERTS.get(db.session.get_bind().dialect.name)
+    if dialect_insert is None:
+        # Motores sin ON CONFLICT: el indice unico rechaza el duplicado
+        try:
+            with db.session.begin_nested():
+                result = db.session.execute(insert(Favorito).from_select(['usuario_id', column], source))
+        except IntegrityError:
+            return None
+        if not result.rowcount:
+            return None
+        favorito_id = db.session.scalar(select(Favorito.id).filter_by(usuario_id=usuario_id, **{column: entity_id}))
+    else:
+        stmt = (
+            dialect_insert(Favorito)
+            .from_select(['usuario_id', column], source)
+            .on_conflict_do_nothing()
+            .returning(Favorito.id)
+        )
+        favorito_id = db.session.scalar(stmt)
+
+    if favorito_id is not None:
+        db.session.execute(counter_update(model, [entity_id], 1))
+    return favorito_id
+
+
+# Contadores de favoritos (favorites_count) de personajes, planetas y
+# vehiculos. Las altas y bajas por el ORM (bajas de los handlers, flask-admin)
+# los actualizan en el mismo flush mediante eventos; las sentencias de Core,
+# como insert_favorite, llaman a counter_update en su misma transaccion.
+# `flask favorites reconcile` corrige cualquier desviacion.
+
+def counter_update(model, entity_ids, delta):
+    return (
+        update(model)
+        .where(model.id.in_(entity_ids) if len(entity_ids) > 1 else model.id == entity_ids[0])
+        .values(favorites_count=model.favorites_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def favorite_targets(target):
+    for model, column in FAVORITE_COLUMNS.items():
+        entity_id = getattr(target, column)
+        if entity_id is not None:
+            yield model, entity_id
+
+
+@event.listens_for(Favorito, 'after_insert')
+def count_inserted_favorite(mapper, connection, target):
+    for model, entity_id in favorite_targets(target):
+        connection.execute(counter_update(model, [entity_id], 1))
+
+
+@event.listens_for(Favorito, 'after_delete')
+def count_deleted_favorite(mapper, connection, target):
+    for model, entity_id in favorite_targets(target):
+        connection.execute(counter_update(model, [entity_id], -1))
+
+
+@event.listens_for(Favorito, 'after_update')
+def count_updated_favorite(mapper, connection, target):
+    # Un favorito editado (flask-admin) puede cambiar de entidad
+    state = inspect(target)
+    for model, column in FAVORITE_COLUMNS.items():
+        history = state.attrs[column].history
+        if not history.has_changes():
+            continue
+        for entity_id in history.deleted:
+            if entity_id is not None:
+                connection.execute(counter_update(model, [entity_id], -1))
+        for entity_id in history.added:
+            if entity_id is not None:
+                connection.execute(counter_update(model, [entity_id], 1))
+
+
+def counter_drift(model):
+    # {id: favoritos reales} de las entidades cuyo contador no cuadra. Una
+    # pasada agrupada por favorito y las entidades con contador distinto de 0
+    # (por el indice), en vez de una subconsulta correlacionada por entidad.
+    column = getattr(Favorito, FAVORITE_COLUMNS[model])
+    actual = dict(db.session.execute(
+        select(column, func.count()).where(column.isnot(None)).group_by(column)
+    ).all())
+    stored = dict(db.session.execute(
+        select(model.id, model.favorites_count).where(model.favorites_count != 0)
+    ).all())
+    missing = [entity_id for entity_id in actual if entity_id not in stored]
+    for start in range(0, len(missing), 500):
+        stored.update(db.session.execute(
+            select(model.id, model.favorites_count).where(model.id.in_(missing[start:start + 500]))
+        ).all())
+    return {entity_id: actual.get(entity_id, 0)
+            for entity_id, count in stored.items() if count != actual.get(entity_id, 0)}
+
+
+def reconcile_counters(model, dry_run=False):
+    drift = counter_drift(model)
+    if drift and not dry_run:
+        db.session.execute(
+            update(model.__table__).where(model.id == db.bindparam('entity_id'))
+            .values(favorites_count=db.bindparam('count')),
+            [{'entity_id': entity_id, 'count': count} for entity_id, count in drift.items()]
+        )
+    return drift
+
+
+@click.group('favorites')
+def favorites_cli():
+    """Mantenimiento de los favoritos."""
+
+
+@favorites_cli.command('reconcile')
+@click.option('--dry-run', is_flag=True, help='Solo informa, no corrige')
+@with_appcontext
+def reconcile_command(dry_run):
+    """Recalcula los contadores de favoritos que no cuadran con la tabla favorito."""
+    try:
+        for model in FAVORITE_COLUMNS:
+            drift = reconcile_counters(model, dry_run)
+            action = 'desviados' if dry_run else 'corregidos'
+            click.echo(f'{model.__tablename__}: {len(drift)} contadores {action}')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+# Altas y bajas de favoritos por lotes: POST /users/favorites/batch con
+#   {"add": {"people": [1, 2], "planets": [3]}, "remove": {"vehicles": [4]}}
+# Todo va en una transaccion y cada tipo de entidad cuesta un INSERT ... SELECT
+# (o un DELETE) y la actualizacion de sus contadores, sea cual sea el tamano.
+FAVORITE_KINDS = {
+    'people': Personajes,
+    'planets': Planetas,
+    'vehicles': Vehiculos,
+}
+
+MAX_BATCH_FAVORITES = 1000
+
+
+def parse_batch(body):
+    # {'add': {modelo: [ids]}, 'remove': {modelo: [ids]}}, validado entero
+    # antes de escribir nada
+    if not isinstance(body, dict) or not body.keys() & {'add', 'remove'} or body.keys() - {'add', 'remove'}:
+        raise APIException("La solicitud debe tener 'add' y/o 'remove'", status_code=400)
+    batch = {}
+    total = 0
+    for action in ('add', 'remove'):
+        groups = body.get(action) or {}
+        if not isinstance(groups, dict):
+            raise APIException(f"'{action}' debe ser un objeto con listas de ids por tipo", status_code=400)
+        batch[action] = {}
+        for kind, ids in groups.items():
+            if kind not in FAVORITE_KINDS:
+                raise APIException(f"Tipo desconocido '{kind}', se admite: {', '.join(FAVORITE_KINDS)}", status_code=400)
+            if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+                raise APIException(f"'{action}.{kind}' debe ser una lista de ids enteros", status_code=400)
+            if ids:
+                batch[action][FAVORITE_KINDS[kind]] = list(dict.fromkeys(ids))
+                total += len(ids)
+    if total > MAX_BATCH_FAVORITES:
+        raise APIException(f"Se admiten como máximo {MAX_BATCH_FAVORITES} ids por solicitud", status_code=413)
+    for model, ids in batch['add'].items():
+        both = set(ids) & set(batch['remove'].get(model, ()))
+        if both:
+            raise APIException(f"Los ids {sorted(both)} aparecen en 'add' y en 'remove'", status_code=400)
+    return batch
+
+
+def add_favorites(usuario_id, model, entity_ids):
+    # INSERT INTO favorito (usuario_id, <col>) SELECT :usuario, id FROM <entidad>
+    # WHERE id IN (...) ON CONFLICT DO NOTHING RETURNING <col>
+    # Los ids inexistentes no salen del SELECT y los repetidos los descarta el
+    # indice unico. Devuelve los ids que se anadieron.
+    column = getattr(Favorito, FAVORITE_COLUMNS[model])
+    source = select(db.literal(usuario_id), model.id).where(model.id.in_(entity_ids))
+
+    dialect_insert = DIALECT_INSERTS.get(db.session.get_bind().dialect.name)
+    if dialect_insert is None:
+        # Motores sin ON CONFLICT ni RETURNING: se excluyen antes los que ya estan
+        existing = select(column).where(Favorito.usuario_id == usuario_id, column.in_(entity_ids))
+        added = db.session.scalars(source.with_only_columns(model.id).where(model.id.not_in(existing))).all()
+        if added:
+            db.session.execute(insert(Favorito).from_select(
+                ['usuario_id', column.key], source.where(model.id.in_(added))))
+    else:
+        stmt = (
+            dialect_insert(Favorito)
+            .from_select(['usuario_id', column.key], source)
+            .on_conflict_do_nothing()
+            .returning(column)
+        )
+        added = db.session.scalars(stmt).all()
+
+    if added:
+        db.session.execute(counter_update(model, added, 1))
+    return added
+
+
+def remove_favorites(usuario_id, model, entity_ids):
+    column = getattr(Favorito, FAVORITE_COLUMNS[model])
+    condition = (Favorito.usuario_id == usuario_id) & column.in_(entity_ids)
+    if db.session.get_bind().dialect.name in DIALECT_INSERTS:
+        removed = db.session.scalars(
+            delete(Favorito).where(condition).returning(column).execution_options(synchronize_session=False)
+        ).all()
+    else:
+        removed = db.session.scalars(select(column).where(condition)).all()
+        db.session.execute(delete(Favorito).where(condition).execution_options(synchronize_session=False))
+
+    if removed:
+        db.session.execute(counter_update(model, removed, -1))
+    return removed
+
+
+def apply_batch(usuario_id, batch):
+    # Devuelve, por tipo, los ids anadidos, los quitados y los que no cambiaron
+    # (entidad inexistente, ya era favorito o no lo era)
+    kinds = {model: kind for kind, model in FAVORITE_KINDS.items()}
+    result = {'added': {}, 'removed': {}, 'unchanged': {}}
+    for action, apply in (('remove', remove_favorites), ('add', add_favorites)):
+        for model, ids in batch[action].items():
+            changed = apply(usuario_id, model, ids)
+            result['added' if action == 'add' else 'removed'][kinds[model]] = sorted(changed)
+            unchanged = sorted(set(ids) - set(changed))
+            if unchanged:
+                result['unchanged'].setdefault(kinds[model], []).extend(unchanged)
+    return result
+
+
+def favorite_ids_query(usuario_id):
+    return select(Favorito.personajes_id, Favorito.planetas_id, Favorito.vehiculos_id) \
+        .where(Favorito.usuario_id == usuario_id).order_by(Favorito.id)
+
+
+def group_favorite_ids(rows):
+    # Vista compacta de los favoritos (?view=ids): listas de ids por tipo
+    ids = {kind: [] for kind in FAVORITE_KINDS}
+    for row in rows:
+        for kind, entity_id in zip(FAVORITE_KINDS, row):
+            if entity_id is not None:
+                ids[kind].append(entity_id)
+    return ids
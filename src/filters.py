@@ -0,0 +1,105 @@
+import operator
+from utils import APIException
+
+# Lenguaje de filtros de los listados:
+#   ?climate=arid              igualdad
+#   ?climate_in=arid,temperate pertenencia
+#   ?name_prefix=Sky           prefijo
+#   ?height_gt=180             rangos (gt, gte, lt, lte) sobre campos numericos
+#   ?sort=name / ?sort=-mass   orden
+# Solo se admiten los campos con indice (FILTER_FIELDS, NUMERIC_FIELDS e id),
+# para que ningun cliente pueda provocar un recorrido completo de la tabla.
+
+RANGE_OPERATORS = {
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+TEXT_OPERATORS = {'eq', 'in', 'prefix'}
+NUMERIC_OPERATORS = {'eq', 'in'} | set(RANGE_OPERATORS)
+MAX_IN_VALUES = 100
+
+
+def resolve_field(model, field):
+    # Devuelve (columna, es_numerica) o None si el campo no tiene indice
+    if field == 'id':
+        return model.id, True
+    if field in model.NUMERIC_FIELDS:
+        return getattr(model, model.NUMERIC_FIELDS[field]), True
+    if field in model.FILTER_FIELDS:
+        return getattr(model, field), False
+    return None
+
+
+def split_filter_key(key, columns):
+    # 'climate' -> ('climate', 'eq'); 'hair_color_in' -> ('hair_color', 'in');
+    # None si el parametro no es un filtro (limit, after, fields...)
+    if key in columns:
+        return key, 'eq'
+    field, _, op = key.rpartition('_')
+    if field in columns and op in NUMERIC_OPERATORS | TEXT_OPERATORS:
+        return field, op
+    return None
+
+
+def parse_value(key, raw, numeric):
+    if not numeric:
+        return raw
+    try:
+        return float(raw)
+    except ValueError:
+        raise APIException(f"El parámetro '{key}' debe ser numérico", status_code=400)
+
+
+def prefix_condition(column, prefix):
+    # El rango [prefijo, siguiente) permite recorrer el indice; el LIKE
+    # garantiza la semantica exacta de "empieza por".
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return (column >= prefix) & (column < upper) & column.startswith(prefix, autoescape=True)
+
+
+def parse_filters(args, model):
+    columns = set(model.__table__.columns.keys())
+    conditions = []
+    for key, raw in args.items():
+        parsed = split_filter_key(key, columns)
+        if parsed is None:
+            continue
+        field, op = parsed
+        resolved = resolve_field(model, field)
+        if resolved is None:
+            raise APIException(f"No se puede filtrar por '{field}': el campo no tiene índice", status_code=400)
+        column, numeric = resolved
+        if op not in (NUMERIC_OPERATORS if numeric else TEXT_OPERATORS):
+            raise APIException(f"El operador '{op}' no se admite para '{field}'", status_code=400)
+
+        if op == 'in':
+            values = [v for v in raw.split(',') if v != '']
+            if not values or len(values) > MAX_IN_VALUES:
+                raise APIException(f"El parámetro '{key}' admite entre 1 y {MAX_IN_VALUES} valores", status_code=400)
+            conditions.append(column.in_([parse_value(key, v, numeric) for v in values]))
+        elif op == 'prefix':
+            if not raw:
+                raise APIException(f"El parámetro '{key}' no puede estar vacío", status_code=400)
+            conditions.append(prefix_condition(column, raw))
+        elif op == 'eq':
+            conditions.append(column == parse_value(key, raw, numeric))
+        else:
+            conditions.append(RANGE_OPERATORS[op](column, parse_value(key, raw, numeric)))
+    return conditions
+
+
+def parse_sort(args, model):
+    # ?sort=<campo> o ?sort=-<campo>; devuelve (columna, descendente) o None
+    raw = args.get('sort')
+    if not raw:
+        return None
+    descending = raw.startswith('-')
+    name = raw.lstrip('-')
+    if name == 'id' and not descending:
+        return None
+    resolved = resolve_field(model, name)
+    if resolved is None:
+        raise APIException(f"No se puede ordenar por '{name}'", status_code=400)
+    return resolved[0], descending
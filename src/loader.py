@@ -0,0 +1,246 @@
+import csv
+import io
+import json
+import os
+import time
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+from models import db, parse_number, Personajes, Planetas, Vehiculos
+from search import reindex, SEARCH_BODY_FIELDS
+from serializers import column_fields
+from cache import response_cache
+from entity_cache import entity_cache
+
+try:
+    # Opcional: orjson parsea el NDJSON varias veces mas rapido
+    from orjson import loads as parse_line
+except ImportError:
+    from json import loads as parse_line
+
+# Carga masiva del catalogo desde volcados con el formato de SWAPI:
+#   flask catalog load people people.json
+#   flask catalog load vehicles vehicles.ndjson --batch-size 50000
+# Admite un array JSON, una pagina de SWAPI ({"results": [...]}), la forma de
+# swapi.tech ({"result": [{"properties": {...}}]}) y NDJSON (.ndjson/.jsonl,
+# un objeto por linea, que se lee sin cargar el fichero entero).
+# Las filas se insertan o, si ya existe una con el mismo nombre, se actualizan.
+# Una fila cuyo valor de otra columna unica (el modelo de los vehiculos) ya es
+# de otra entidad, en la tabla o antes en el volcado, se omite y se informa en
+# vez de abortar la carga.
+# Postgres: COPY a una tabla temporal y un unico INSERT ... ON CONFLICT.
+# SQLite: executemany por lotes con ON CONFLICT, en una sola transaccion.
+
+CATALOG_MODELS = {
+    'people': Personajes,
+    'planets': Planetas,
+    'vehicles': Vehiculos,
+}
+
+# Campos de SWAPI que son listas y se guardan como JSON en texto
+LIST_FIELDS = ('films', 'pilots')
+
+DEFAULT_BATCH_SIZE = 10000
+MAX_REPORTED_REJECTS = 20
+
+
+def source_fields(model):
+    # Columnas que vienen del volcado: las serializables menos el id (sin las
+    # numericas derivadas ni el contador de favoritos)
+    return [name for name in column_fields(model) if name != 'id']
+
+
+def unique_keys(model):
+    # Columnas unicas ademas del nombre, que es la clave de la carga
+    return [column.name for column in model.__table__.columns
+            if column.unique and column.name not in ('id', 'name')]
+
+
+def read_items(path):
+    if os.path.splitext(path)[1].lower() in ('.ndjson', '.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield parse_line(line)
+        return
+
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('results', data.get('result', [data]))
+    yield from data
+
+
+def to_row(fields, numeric_fields, item):
+    # Tupla con los campos del volcado seguidos de sus columnas numericas
+    item = item.get('properties', item)
+    row = []
+    for field in fields:
+        value = item.get(field)
+        if field in LIST_FIELDS:
+            value = json.dumps(value if value is not None else [])
+        elif value is None:
+            value = 'unknown'
+        row.append(str(value))
+    row.extend(parse_number(item.get(field)) for field in numeric_fields)
+    return tuple(row)
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def sqlite_owners(connection, model, key, values):
+    # {valor: nombre} de las entidades que ya tienen esos valores de key
+    owners = {}
+    for start in range(0, len(values), 500):
+        chunk = values[start:start + 500]
+        owners.update(connection.exec_driver_sql(
+            f"SELECT {key}, name FROM {model.__tablename__} WHERE {key} IN ({', '.join('?' for _ in chunk)})",
+            tuple(chunk)
+        ).all())
+    return owners
+
+
+def sqlite_accepted(connection, model, columns, batch, reject):
+    # Filas del lote sin conflicto en las otras claves unicas. Los lotes
+    # anteriores ya estan en la tabla; dentro del lote gana la primera fila.
+    name_index = columns.index('name')
+    for key in unique_keys(model):
+        index = columns.index(key)
+        owners = sqlite_owners(connection, model, key, list({row[index] for row in batch}))
+        accepted = []
+        for row in batch:
+            if owners.setdefault(row[index], row[name_index]) == row[name_index]:
+                accepted.append(row)
+            else:
+                reject(row[name_index], key, row[index])
+        batch = accepted
+    return batch
+
+
+def sqlite_load(model, columns, chunks, progress, reject):
+    # SQL escrito a mano y tuplas directas al driver: con millones de filas el
+    # coste de preparar parametros por fila en SQLAlchemy es el cuello de botella
+    updates = ', '.join(f'{column} = excluded.{column}' for column in columns if column != 'name')
+    statement = (f"INSERT INTO {model.__tablename__} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join('?' for _ in columns)}) "
+                 f"ON CONFLICT (name) DO UPDATE SET {updates}")
+    connection = db.session.connection()
+    # Cache de paginas amplio (256 MiB) mientras dura la carga: los indices
+    # caben en memoria y cada insercion no vuelve a leerlos de disco
+    connection.exec_driver_sql('PRAGMA cache_size = -262144')
+    for batch in chunks:
+        accepted = sqlite_accepted(connection, model, columns, batch, reject)
+        if accepted:
+            connection.exec_driver_sql(statement, accepted)
+        progress(len(batch))
+
+
+def postgres_load(model, columns, chunks, progress, reject):
+    # COPY a una tabla temporal y luego un INSERT ... SELECT. DISTINCT ON se
+    # queda con la ultima aparicion de cada nombre, como haria SQLite.
+    table = model.__tablename__
+    column_list = ', '.join(columns)
+    updates = ', '.join(f'{column} = EXCLUDED.{column}' for column in columns if column != 'name')
+    cursor = db.session.connection().connection.cursor()
+    cursor.execute(f'CREATE TEMP TABLE catalog_load ON COMMIT DROP AS SELECT {column_list} FROM {table} WITH NO DATA')
+    cursor.execute('ALTER TABLE catalog_load ADD COLUMN load_seq bigserial')
+    for batch in chunks:
+        buffer = io.StringIO()
+        # Texto entre comillas y None sin ellas: en CSV de Postgres "" es la
+        # cadena vacia y un campo vacio sin comillas es NULL
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerows(batch)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY catalog_load ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+        progress(len(batch))
+    for key in unique_keys(model):
+        # Primero los valores que ya son de otra entidad de la tabla y despues
+        # los repetidos en el volcado, donde gana la primera aparicion
+        cursor.execute(f'DELETE FROM catalog_load l USING {table} t '
+                       f'WHERE l.{key} = t.{key} AND l.name <> t.name RETURNING l.name, l.{key}')
+        rejected = cursor.fetchall()
+        cursor.execute(f'DELETE FROM catalog_load l USING catalog_load f '
+                       f'WHERE l.{key} = f.{key} AND l.name <> f.name AND f.load_seq < l.load_seq '
+                       f'RETURNING l.name, l.{key}')
+        for name, value in rejected + cursor.fetchall():
+            reject(name, key, value)
+    cursor.execute(
+        f'INSERT INTO {table} ({column_list}) '
+        f'SELECT DISTINCT ON (name) {column_list} FROM catalog_load ORDER BY name, load_seq DESC '
+        f'ON CONFLICT (name) DO UPDATE SET {updates}'
+    )
+
+
+def load_catalog(kind, path, batch_size=DEFAULT_BATCH_SIZE, progress=lambda count: None):
+    model = CATALOG_MODELS[kind]
+    fields = source_fields(model)
+    columns = fields + list(model.NUMERIC_FIELDS.values())
+    rows = (to_row(fields, list(model.NUMERIC_FIELDS), item) for item in read_items(path))
+
+    load = postgres_load if db.engine.dialect.name == 'postgresql' else sqlite_load
+    loaded = 0
+    # (nombre, columna, valor) de las filas omitidas
+    rejected = []
+
+    def count(size):
+        nonlocal loaded
+        loaded += size
+        progress(size)
+
+    try:
+        last_id = db.session.scalar(select(func.max(model.id))) or 0
+        load(model, columns, batches(rows, batch_size), count,
+             lambda name, key, value: rejected.append((name, key, value)))
+        inserted = db.session.scalar(select(func.count()).where(model.id > last_id))
+        # Si todo fueron altas basta con indexar las filas nuevas. Las
+        # actualizaciones no cambian el nombre, asi que solo obligan a rehacer
+        # el indice del tipo cuando este indexa mas campos (planetas, vehiculos)
+        full = inserted != loaded - len(rejected) and SEARCH_BODY_FIELDS[model]
+        reindex(model, after_id=None if full else last_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    response_cache.invalidate(kind)
+    entity_cache.invalidate(kind)
+    return rejected
+
+
+@click.group('catalog')
+def catalog_cli():
+    """Carga masiva del catalogo."""
+
+
+@catalog_cli.command('load')
+@click.argument('kind', type=click.Choice(list(CATALOG_MODELS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, help='Filas por lote')
+@with_appcontext
+def load_command(kind, path, batch_size):
+    """Inserta o actualiza por nombre las entidades de un volcado de SWAPI."""
+    started = time.perf_counter()
+    loaded = 0
+
+    def progress(count):
+        nonlocal loaded
+        loaded += count
+        elapsed = time.perf_counter() - started
+        click.echo(f'\r{kind}: {loaded} filas ({loaded / elapsed:,.0f} filas/s)', nl=False, err=True)
+
+    rejected = load_catalog(kind, path, batch_size, progress)
+    click.echo(f'\n{kind}: {loaded - len(rejected)} filas cargadas en {time.perf_counter() - started:.1f}s', err=True)
+    if rejected:
+        click.echo(f'{kind}: {len(rejected)} filas omitidas por repetir una columna unica:', err=True)
+        for name, key, value in rejected[:MAX_REPORTED_REJECTS]:
+            click.echo(f"  {name}: {key} '{value}' ya es de otra entidad", err=True)
+        if len(rejected) > MAX_REPORTED_REJECTS:
+            click.echo(f'  ... y {len(rejected) - MAX_REPORTED_REJECTS} mas', err=True)
@@ -0,0 +1,107 @@
+import os
+import time
+from contextvars import ContextVar
+from flask import Response, current_app, g, request
+from sqlalchemy import event
+from werkzeug.local import LocalProxy
+from tracker import query_budget
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+
+# Metricas por ruta en formato Prometheus (GET /metrics).
+# Con gunicorn cada worker es un proceso distinto: hay que definir
+# PROMETHEUS_MULTIPROC_DIR (un directorio vacio, que se limpia en cada
+# despliegue) para que los workers escriban sus valores ahi y /metrics sume
+# los de todos, sirva la peticion el worker que la sirva.
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+LABELS = ('method', 'route', 'status')
+
+REQUESTS = Counter('http_requests_total', 'Peticiones atendidas', LABELS)
+LATENCY = Histogram('http_request_duration_seconds', 'Latencia de las peticiones', LABELS)
+RESPONSE_BYTES = Histogram('http_response_size_bytes', 'Tamaño del cuerpo de las respuestas', LABELS,
+                           buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+DB_QUERIES = Histogram('http_request_db_queries', 'Consultas SQL por peticion', LABELS,
+                       buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+DB_SECONDS = Histogram('http_request_db_seconds', 'Tiempo en la base de datos por peticion', LABELS,
+                       buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+
+# [consultas, segundos] de la peticion en curso. Es un ContextVar para que
+# sirva igual con hilos (Flask) que con tareas asyncio (asgi.py).
+current_db_usage = ContextVar('current_db_usage', default=None)
+
+
+def start_db_usage():
+    usage = [0, 0.0]
+    current_db_usage.set(usage)
+    return usage
+
+
+def attach_engine(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        usage = current_db_usage.get()
+        if usage is not None:
+            usage[0] += 1
+            usage[1] += elapsed
+
+
+def observe_request(method, route, status, seconds, size, usage):
+    labels = (method, route, str(status))
+    REQUESTS.labels(*labels).inc()
+    LATENCY.labels(*labels).observe(seconds)
+    if size is not None:
+        RESPONSE_BYTES.labels(*labels).observe(size)
+    if usage is not None:
+        DB_QUERIES.labels(*labels).observe(usage[0])
+        DB_SECONDS.labels(*labels).observe(usage[1])
+
+
+def render_metrics():
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+@query_budget(0)
+def handle_metrics():
+    return Response(render_metrics(), content_type=CONTENT_TYPE_LATEST)
+
+
+class RequestMetrics:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'handle_metrics', handle_metrics, methods=['GET'])
+        app.extensions['request_metrics'] = self
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_db = start_db_usage()
+
+    def _after_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        # La regla (/people/<int:people_id>) y no la URL, para acotar las etiquetas
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        size = None if response.is_streamed else response.calculate_content_length()
+        observe_request(request.method, route, response.status_code,
+                        time.perf_counter() - start, size, g.pop('metrics_db', None))
+        return response
+
+
+# RequestMetrics de la app actual
+request_metrics = LocalProxy(lambda: current_app.extensions['request_metrics'])
@@ -1,8 +1,40 @@
+import math
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, ForeignKey, Integer
+from sqlalchemy import Column, ForeignKey, Integer, event
 from sqlalchemy.orm import relationship
-
-db = SQLAlchemy()
+from serializers import serializer
+from replica import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+NULL_NUMBERS = {'', 'unknown', 'n/a', 'none', 'indefinite'}
+
+def parse_number(value):
+    # Normaliza los numeros de SWAPI guardados como texto:
+    # "1,358" -> 1358.0, "78.2" -> 78.2, "unknown"/"n/a"/"30-165" -> None
+    if value is None:
+        return None
+    text = str(value).strip().lower().replace(',', '')
+    if text in NULL_NUMBERS:
+        return None
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+def numeric_shadow(source):
+    # Columna numerica indexada que acompaña a una columna de texto. El default
+    # se calcula a partir de los parametros del INSERT, asi que tambien se
+    # rellena en los executemany del alta masiva, no solo desde el ORM.
+    def default(context):
+        return parse_number(context.get_current_parameters().get(source))
+    return db.Column(db.Float, nullable=True, index=True, default=default)
+
+def favorites_counter():
+    # Numero de favoritos de la entidad, mantenido al crear y borrar favoritos
+    # (ver favorites.py). El indice sirve el ranking sin agrupar la tabla favorito.
+    return db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -10,16 +42,12 @@ class User(db.Model):
     password = db.Column(db.String(80), nullable=False)
     is_active = db.Column(db.Boolean(), nullable=False)
 
+    # do not serialize the password, its a security breach
+    SERIALIZE_EXCLUDE = ('password', 'is_active')
+
     def __repr__(self):
         return f'<User {self.id}>'
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "email": self.email,
-            # do not serialize the password, its a security breach
-        }
-
 class Usuario(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(120), nullable=False)
@@ -28,46 +56,33 @@ class Usuario(db.Model):
     password = db.Column(db.String(80), nullable=False)
     usuario_favoritos = relationship('Favorito', backref='usuario', lazy=True)
 
+    SERIALIZE_EXCLUDE = ('password',)
+    SERIALIZE_RELATIONS = {'usuario_favoritos': 'usuario_favoritos'}
+
     def __repr__(self):
         return f'<Usuario {self.id}>'
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "nombre": self.nombre,
-            "apellido": self.apellido,
-            "email": self.email,
-            "password": self.password,
-            "usuario_favoritos": [item.serialize() for item in self.usuario_favoritos]
-        }
-
 class Personajes(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), unique=True, nullable=False)
     mass = db.Column(db.String(120), nullable=False)
-    hair_color = db.Column(db.String(120), nullable=False)
+    hair_color = db.Column(db.String(120), nullable=False, index=True)
     skin_color = db.Column(db.String(120), nullable=False)
-    eye_color = db.Column(db.String(120), nullable=False)
+    eye_color = db.Column(db.String(120), nullable=False, index=True)
     birth_year = db.Column(db.String(120), nullable=False)
-    gender = db.Column(db.String(120), nullable=False)
+    gender = db.Column(db.String(120), nullable=False, index=True)
     height = db.Column(db.String(120), nullable=False)
+    mass_num = numeric_shadow('mass')
+    height_num = numeric_shadow('height')
+    favorites_count = favorites_counter()
+
+    NUMERIC_FIELDS = {'mass': 'mass_num', 'height': 'height_num'}
+    FILTER_FIELDS = ('name', 'gender', 'eye_color', 'hair_color')
+    SERIALIZE_EXCLUDE = ('favorites_count',)
 
     def __repr__(self):
         return f'<Personajes {self.id}>'
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "mass": self.mass,
-            "hair_color": self.hair_color,
-            "skin_color": self.skin_color,
-            "eye_color": self.eye_color,
-            "birth_year": self.birth_year,
-            "gender": self.gender,
-            "height": self.height
-        }
-
 class Planetas(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), unique=True, nullable=False)
@@ -76,33 +91,26 @@ class Planetas(db.Model):
     orbital_period = db.Column(db.String(120), nullable=False)
     gravity = db.Column(db.String(120), nullable=False)
     population = db.Column(db.String(120), nullable=False)
-    climate = db.Column(db.String(120), nullable=False)
-    terrain = db.Column(db.String(120), nullable=False)
+    climate = db.Column(db.String(120), nullable=False, index=True)
+    terrain = db.Column(db.String(120), nullable=False, index=True)
     surface_water = db.Column(db.String(120), nullable=False)
+    diameter_num = numeric_shadow('diameter')
+    population_num = numeric_shadow('population')
+    favorites_count = favorites_counter()
+
+    NUMERIC_FIELDS = {'diameter': 'diameter_num', 'population': 'population_num'}
+    FILTER_FIELDS = ('name', 'climate', 'terrain')
+    SERIALIZE_EXCLUDE = ('favorites_count',)
 
     def __repr__(self):
         return f'<Planetas {self.id}>'
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "diameter": self.diameter,
-            "rotation_period": self.rotation_period,
-            "orbital_period": self.orbital_period,
-            "gravity": self.gravity,
-            "population": self.population,
-            "climate": self.climate,
-            "terrain": self.terrain,
-            "surface_water": self.surface_water
-        }
-
 class Vehiculos(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), unique=True, nullable=False)
     model = db.Column(db.String(120), unique=True, nullable=False)
-    vehicle_class = db.Column(db.String(120), nullable=False)
-    manufacturer = db.Column(db.String(120), nullable=False)
+    vehicle_class = db.Column(db.String(120), nullable=False, index=True)
+    manufacturer = db.Column(db.String(120), nullable=False, index=True)
     cost_in_credits = db.Column(db.String(120), nullable=False)
     length = db.Column(db.String(120), nullable=False)
     crew = db.Column(db.String(120), nullable=False)
@@ -112,29 +120,27 @@ class Vehiculos(db.Model):
     consumables = db.Column(db.String(120), nullable=False)
     films = db.Column(db.String(120), nullable=False)
     pilots = db.Column(db.String(120), nullable=False)
+    cost_in_credits_num = numeric_shadow('cost_in_credits')
+    length_num = numeric_shadow('length')
+    crew_num = numeric_shadow('crew')
+    favorites_count = favorites_counter()
+
+    NUMERIC_FIELDS = {'cost_in_credits': 'cost_in_credits_num', 'length': 'length_num', 'crew': 'crew_num'}
+    FILTER_FIELDS = ('name', 'model', 'vehicle_class', 'manufacturer')
+    SERIALIZE_EXCLUDE = ('favorites_count',)
 
     def __repr__(self):
         return f'<Vehiculos {self.id}>'
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "model": self.model,
-            "vehicle_class": self.vehicle_class,
-            "manufacturer": self.manufacturer,
-            "cost_in_credits": self.cost_in_credits,
-            "length": self.length,
-            "crew": self.crew,
-            "passengers": self.passengers,
-            "max_atmosphering_speed": self.max_atmosphering_speed,
-            "cargo_capacity": self.cargo_capacity,
-            "consumables": self.consumables,
-            "films": self.films,
-            "pilots": self.pilots
-        }
-
 class Favorito(db.Model):
+    # Un usuario no puede repetir favorito; los NULL no colisionan, asi que cada
+    # indice solo aplica a las filas de su tipo de entidad.
+    __table_args__ = (
+        db.Index('ix_favorito_usuario_personajes', 'usuario_id', 'personajes_id', unique=True),
+        db.Index('ix_favorito_usuario_planetas', 'usuario_id', 'planetas_id', unique=True),
+        db.Index('ix_favorito_usuario_vehiculos', 'usuario_id', 'vehiculos_id', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = Column(Integer, ForeignKey('usuario.id'))
     personajes_id = Column(Integer, ForeignKey('personajes.id'))
@@ -144,14 +150,22 @@ class Favorito(db.Model):
     planetas_id = Column(Integer, ForeignKey('planetas.id'))
     planetas = relationship(Planetas)
 
+    SERIALIZE_EXCLUDE = ('personajes_id', 'vehiculos_id', 'planetas_id')
+    SERIALIZE_RELATIONS = {'personaje': 'personajes', 'vehiculo': 'vehiculos', 'planeta': 'planetas'}
+
     def __repr__(self):
         return f'<Favorito {self.id}>'
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "usuario_id": self.usuario_id,
-            "personaje": self.personajes.serialize() if self.personajes else None,
-            "vehiculo": self.vehiculos.serialize() if self.vehiculos else None,
-            "planeta": self.planetas.serialize() if self.planetas else None
-        }
+
+def sync_numeric_fields(mapper, connection, target):
+    # En las ediciones (p. ej. desde flask-admin) se recalculan las columnas
+    # numericas a partir del texto actual.
+    for source, shadow in target.NUMERIC_FIELDS.items():
+        setattr(target, shadow, parse_number(getattr(target, source)))
+
+for model in (Personajes, Planetas, Vehiculos):
+    event.listen(model, 'before_update', sync_numeric_fields)
+
+# serialize() de cada modelo, generado a partir de sus columnas (ver serializers.py)
+for model in (User, Usuario, Personajes, Planetas, Vehiculos, Favorito):
+    model.serialize = serializer(model)
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from werkzeug.local import LocalProxy
+
+# Opciones del pool de conexiones, configurables junto a DATABASE_URL:
+#   DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT  (por defecto los de SQLAlchemy)
+#   DB_POOL_RECYCLE   segundos antes de reciclar una conexion (1800)
+#   DB_POOL_PRE_PING  comprueba la conexion antes de usarla (1)
+POOL_ENV_OPTIONS = {
+    'DB_POOL_SIZE': 'pool_size',
+    'DB_MAX_OVERFLOW': 'max_overflow',
+    'DB_POOL_TIMEOUT': 'pool_timeout',
+}
+
+
+class PoolStats:
+    # Contadores del engine de una app en este proceso; cada worker de
+    # gunicorn expone los suyos.
+    def __init__(self, app=None, db=None):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        with app.app_context():
+            self.attach(db.engine)
+        app.extensions['pool_stats'] = self
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def attach(self, engine):
+        engine.pool.stats = self
+        event.listen(engine, 'connect', lambda *args: self.increment('connects'))
+        event.listen(engine, 'close', lambda *args: self.increment('closes'))
+        event.listen(engine, 'close_detached', lambda *args: self.increment('closes'))
+        event.listen(engine, 'invalidate', lambda *args: self.increment('invalidations'))
+
+    def to_dict(self, engine):
+        pool = engine.pool
+        with self._lock:
+            stats = {
+                'pid': os.getpid(),
+                'pool_class': type(pool).__name__,
+                'connections_opened': self.connects,
+                'connections_closed': self.closes,
+                'connections_invalidated': self.invalidations,
+                'checkouts': self.checkouts,
+                'checkout_wait_seconds_total': self.wait_seconds_total,
+                'checkout_wait_seconds_max': self.wait_seconds_max,
+                'checkout_wait_seconds_avg': self.wait_seconds_total / self.checkouts if self.checkouts else 0.0,
+            }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'timeout': pool.timeout(),
+            })
+        return stats
+
+
+# PoolStats de la app actual
+pool_stats = LocalProxy(lambda: current_app.extensions['pool_stats'])
+
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool que mide cuanto tarda cada checkout (espera en la cola mas,
+    # si hace falta, la apertura de una conexion nueva) en el PoolStats que
+    # le asigna attach().
+    stats = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.stats is not None:
+                self.stats.record_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() sustituye el pool por uno nuevo: conserva las estadisticas
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def env_flag(name, default):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+def engine_options_from_env(database_uri, instrument=True):
+    options = {
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', '1'),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+    for env_name, option in POOL_ENV_OPTIONS.items():
+        if os.getenv(env_name):
+            options[option] = int(os.getenv(env_name))
+
+    url = make_url(database_uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # SQLite en memoria usa su propio pool sin tamaño configurable
+        return {'pool_pre_ping': options['pool_pre_ping']}
+    if instrument:
+        options['poolclass'] = InstrumentedQueuePool
+    return options
@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+import time
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from werkzeug.local import LocalProxy
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql import Select
+
+# Lecturas contra una replica de la base de datos:
+#   DATABASE_REPLICA_URL    bind 'replica'; sin ella todo va al primario
+#   REPLICA_MAX_LAG         segundos de retraso tolerados (5)
+#   REPLICA_CHECK_INTERVAL  segundos entre comprobaciones de la replica (10)
+#   REPLICA_STICKY_SECONDS  tras escribir, el cliente lee del primario (5)
+#   REPLICA_LAG_SQL         consulta que devuelve el retraso en segundos; por
+#                           defecto la de Postgres, y 0 en otras bases de datos
+#
+# Solo las rutas marcadas con @replica_reads leen de la replica, y solo en
+# peticiones GET. Las escrituras y cualquier sentencia que no sea un SELECT
+# van siempre al primario. Para leer lo que uno mismo acaba de escribir, una
+# escritura deja una cookie con la que las lecturas de ese cliente vuelven al
+# primario durante REPLICA_STICKY_SECONDS.
+#
+# En local se puede probar con dos ficheros SQLite:
+#   DATABASE_URL=sqlite:////tmp/primary.db DATABASE_REPLICA_URL=sqlite:////tmp/replica.db
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = 'replica'
+STICKY_COOKIE = 'db_primary_until'
+
+POSTGRES_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
+
+def replica_reads(view):
+    # Marca una ruta GET como apta para leer de la replica. Va debajo de
+    # @app.route, como @query_budget.
+    view.replica_reads = True
+    return view
+
+
+def replica_bind_from_env(engine_options):
+    url = os.getenv('DATABASE_REPLICA_URL')
+    if not url:
+        return {}
+    return {REPLICA_BIND: {'url': url.replace('postgres://', 'postgresql://'), **engine_options(url)}}
+
+
+class RoutingSession(Session):
+    # Sesion de Flask-SQLAlchemy que envia los SELECT a la replica cuando la
+    # peticion lo permite (g.db_replica). Un flush nunca se enruta a la replica.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and isinstance(clause, Select) and has_app_context() and g.get('db_replica'):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    def __init__(self, app=None, db=None):
+        self.engine = None
+        self.healthy = False
+        self.lag = None
+        self.checked_at = None
+        self.checks = 0
+        self.failures = 0
+        self.replica_requests = 0
+        self.primary_requests = 0
+        self.primary_until = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.max_lag = float(app.config.get('REPLICA_MAX_LAG', os.getenv('REPLICA_MAX_LAG', 5)))
+        self.interval = float(app.config.get('REPLICA_CHECK_INTERVAL', os.getenv('REPLICA_CHECK_INTERVAL', 10)))
+        self.sticky = int(app.config.get('REPLICA_STICKY_SECONDS', os.getenv('REPLICA_STICKY_SECONDS', 5)))
+        self.lag_sql = app.config.get('REPLICA_LAG_SQL', os.getenv('REPLICA_LAG_SQL'))
+        app.extensions['replica_router'] = self
+        if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+            return
+        with app.app_context():
+            self.engine = db.engines[REPLICA_BIND]
+        self.watch(self.engine)
+        # Se registra antes que las metricas y el control de consultas para
+        # que la comprobacion de salud no cuente como consulta de la peticion
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def hold_primary(self, seconds=None):
+        # Tras una escritura de cualquier worker (invalidacion de caches) las
+        # lecturas de este proceso van al primario mientras la replica se pone
+        # al dia, para no guardar en cache datos antiguos
+        self.primary_until = time.monotonic() + (self.max_lag if seconds is None else seconds)
+
+    def watch(self, engine):
+        # Engines que leen de la replica (tambien los async de asgi.py): un
+        # fallo de conexion en cualquiera la da por caida
+        event.listen(engine, 'handle_error', self._on_error)
+
+    def _on_error(self, context):
+        # Un fallo de conexion con la replica la da por caida hasta la
+        # siguiente comprobacion
+        if isinstance(context.sqlalchemy_exception, OperationalError):
+            with self._lock:
+                self.healthy = False
+                self.checked_at = time.monotonic()
+
+    def measure_lag(self, connection):
+        if self.lag_sql:
+            return float(connection.execute(text(self.lag_sql)).scalar() or 0)
+        if connection.dialect.name == 'postgresql':
+            return float(connection.execute(text(POSTGRES_LAG_SQL)).scalar() or 0)
+        connection.execute(text('SELECT 1'))
+        return 0.0
+
+    def check(self):
+        try:
+            with self.engine.connect() as connection:
+                lag = self.measure_lag(connection)
+        except Exception as error:
+            logger.warning('replica no disponible: %s', error)
+            lag, healthy = None, False
+        else:
+            healthy = lag <= self.max_lag
+            if not healthy:
+                logger.warning('replica con %.1fs de retraso (maximo %.1fs)', lag, self.max_lag)
+        with self._lock:
+            self.lag = lag
+            self.healthy = healthy
+            self.checks += 1
+            self.failures += not healthy
+            self.checked_at = time.monotonic()
+        return healthy
+
+    def available(self):
+        if self.checked_at is None or time.monotonic() - self.checked_at >= self.interval:
+            return self.check()
+        return self.healthy
+
+    def use_replica(self):
+        if request.method != 'GET' or self.engine is None:
+            return False
+        view = current_app.view_functions.get(request.endpoint)
+        if not getattr(view, 'replica_reads', False):
+            return False
+        if time.monotonic() < self.primary_until:
+            return False
+        try:
+            if float(request.cookies.get(STICKY_COOKIE, 0)) > time.time():
+                return False
+        except ValueError:
+            pass
+        return self.available()
+
+    def before_request(self):
+        g.db_replica = self.use_replica()
+        with self._lock:
+            if g.db_replica:
+                self.replica_requests += 1
+            else:
+                self.primary_requests += 1
+
+    def after_request(self, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            self.hold_primary()
+            if self.sticky > 0:
+                response.set_cookie(STICKY_COOKIE, str(int(time.time()) + self.sticky),
+                                    max_age=self.sticky, httponly=True)
+        return response
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'configured': self.engine is not None,
+                'healthy': self.healthy,
+                'lag_seconds': self.lag,
+                'max_lag_seconds': self.max_lag,
+                'checks': self.checks,
+                'failures': self.failures,
+                'replica_requests': self.replica_requests,
+                'primary_requests': self.primary_requests,
+            }
+
+
+# ReplicaRouter de la app actual
+replica_router = LocalProxy(lambda: current_app.extensions['replica_router'])
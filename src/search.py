@@ -0,0 +1,153 @@
+import re
+from sqlalchemy import text
+from models import db, Personajes, Planetas, Vehiculos
+
+# Busqueda de texto completo sobre el catalogo.
+#  - Postgres: cada tabla tiene una columna generada search_vector (tsvector)
+#    con indice GIN; la mantiene la propia base de datos.
+#  - SQLite: una tabla virtual FTS5 (catalog_search) que los handlers de
+#    alta y borrado actualizan en la misma transaccion.
+# Ambas se crean en la migracion 5a0c7e93d218.
+
+SEARCH_KINDS = {
+    Personajes: 'people',
+    Planetas: 'planets',
+    Vehiculos: 'vehicles',
+}
+
+# Columnas de texto indexadas ademas del nombre
+SEARCH_BODY_FIELDS = {
+    Personajes: (),
+    Planetas: ('climate', 'terrain'),
+    Vehiculos: ('model', 'manufacturer', 'vehicle_class'),
+}
+
+MAX_QUERY_TERMS = 10
+
+SQLITE_SEARCH = text("""
+    SELECT kind, entity_id, name, score FROM (
+        SELECT kind, entity_id, name, bm25(catalog_search, 0.0, 0.0, 10.0, 1.0) AS score
+        FROM catalog_search WHERE catalog_search MATCH :query
+    ) AS hits
+    WHERE :after_score IS NULL
+       OR score > :after_score
+       OR (score = :after_score AND (kind > :after_kind OR (kind = :after_kind AND entity_id > :after_id)))
+    ORDER BY score, kind, entity_id
+    LIMIT :limit
+""")
+
+POSTGRES_SEARCH = text("""
+    SELECT kind, entity_id, name, score FROM (
+        SELECT 'people' AS kind, id AS entity_id, name, -ts_rank(search_vector, q)::float8 AS score
+        FROM personajes, to_tsquery('simple', :query) AS q WHERE search_vector @@ q
+        UNION ALL
+        SELECT 'planets', id, name, -ts_rank(search_vector, q)::float8
+        FROM planetas, to_tsquery('simple', :query) AS q WHERE search_vector @@ q
+        UNION ALL
+        SELECT 'vehicles', id, name, -ts_rank(search_vector, q)::float8
+        FROM vehiculos, to_tsquery('simple', :query) AS q WHERE search_vector @@ q
+    ) AS hits
+    WHERE CAST(:after_score AS float8) IS NULL
+       OR score > :after_score
+       OR (score = :after_score AND (kind > :after_kind OR (kind = :after_kind AND entity_id > :after_id)))
+    ORDER BY score, kind, entity_id
+    LIMIT :limit
+""")
+
+
+def dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+def query_terms(q):
+    # Solo caracteres de palabra: evita inyectar sintaxis de MATCH/tsquery
+    return re.findall(r'\w+', q.lower())[:MAX_QUERY_TERMS]
+
+
+def index_rows(model, rows):
+    # rows: dicts con el id y los campos de texto de cada entidad
+    if dialect_name() != 'sqlite' or not rows:
+        return
+    kind = SEARCH_KINDS[model]
+    db.session.execute(
+        text("INSERT INTO catalog_search (kind, entity_id, name, body) VALUES (:kind, :entity_id, :name, :body)"),
+        [{
+            'kind': kind,
+            'entity_id': row['id'],
+            'name': row['name'],
+            'body': ' '.join(str(row[field]) for field in SEARCH_BODY_FIELDS[model]),
+        } for row in rows]
+    )
+
+
+def index_entity(entity):
+    model = type(entity)
+    fields = ('id', 'name') + SEARCH_BODY_FIELDS[model]
+    index_rows(model, [{field: getattr(entity, field) for field in fields}])
+
+
+def reindex(model, after_id=None):
+    # Reconstruye el indice de un tipo a partir de la tabla, tras cargas
+    # masivas que no pasan por index_rows. Con after_id solo se añaden las
+    # filas nuevas (id > after_id), mucho mas barato que rehacerlo entero.
+    if dialect_name() != 'sqlite':
+        return
+    table = model.__tablename__
+    body = " || ' ' || ".join(SEARCH_BODY_FIELDS[model]) or "''"
+    params = {'kind': SEARCH_KINDS[model], 'after_id': after_id or 0}
+    if after_id is None:
+        db.session.execute(text("DELETE FROM catalog_search WHERE kind = :kind"), params)
+    db.session.execute(
+        text(f"INSERT INTO catalog_search (kind, entity_id, name, body) "
+             f"SELECT :kind, id, name, {body} FROM {table} WHERE id > :after_id"),
+        params
+    )
+
+
+def remove_entity(model, entity_id):
+    if dialect_name() != 'sqlite':
+        return
+    db.session.execute(
+        text("DELETE FROM catalog_search WHERE kind = :kind AND entity_id = :entity_id"),
+        {'kind': SEARCH_KINDS[model], 'entity_id': entity_id}
+    )
+
+
+def search(q, limit, after=None):
+    # Devuelve (hits, cursor). El cursor es (score, kind, id) del ultimo hit;
+    # la puntuacion es ascendente (bm25 en SQLite, -ts_rank en Postgres).
+    terms = query_terms(q)
+    if dialect_name() == 'postgresql':
+        statement = POSTGRES_SEARCH
+        query = ' & '.join(f'{term}:*' for term in terms)
+    else:
+        statement = SQLITE_SEARCH
+        query = ' '.join(f'"{term}"*' for term in terms)
+
+    after_score, after_kind, after_id = after or (None, None, None)
+    rows = db.session.execute(statement, {
+        'query': query,
+        'after_score': after_score,
+        'after_kind': after_kind,
+        'after_id': after_id,
+        'limit': limit + 1,
+    }).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1].score, rows[-1].kind, rows[-1].entity_id)
+    hits = [{'type': row.kind, 'id': row.entity_id, 'name': row.name, 'score': row.score} for row in rows]
+    return hits, next_cursor
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Alembic autogenerate: los objetos de busqueda se gestionan a mano en la
+    # migracion y no existen en models.py
+    if type_ == 'table' and name.startswith('catalog_search'):
+        return False
+    if type_ == 'column' and name == 'search_vector':
+        return False
+    if type_ == 'index' and name.endswith('_search_vector'):
+        return False
+    return True
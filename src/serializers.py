@@ -0,0 +1,48 @@
+import functools
+from sqlalchemy import inspect
+
+# Serializadores generados a partir de los metadatos de cada modelo, en lugar
+# de diccionarios escritos a mano en cada serialize():
+#   - se emiten todas las columnas de la tabla salvo las numericas derivadas
+#     (NUMERIC_FIELDS) y las de SERIALIZE_EXCLUDE (p. ej. Usuario.password);
+#   - SERIALIZE_RELATIONS anade relaciones anidadas, {clave: relacion}, que se
+#     serializan con el serializador completo del modelo relacionado.
+# serializer(model, fields) compila una funcion por conjunto de campos y la
+# guarda, asi que ?fields= no construye el objeto entero para luego filtrarlo.
+
+
+def column_fields(model):
+    excluded = set(getattr(model, 'NUMERIC_FIELDS', {}).values()) | set(getattr(model, 'SERIALIZE_EXCLUDE', ()))
+    return [attr.key for attr in inspect(model).column_attrs if attr.key not in excluded]
+
+
+def serializable_fields(model):
+    return column_fields(model) + list(getattr(model, 'SERIALIZE_RELATIONS', {}))
+
+
+@functools.lru_cache(maxsize=None)
+def compile_serializer(model, fields):
+    relations = getattr(model, 'SERIALIZE_RELATIONS', {})
+    mapper = inspect(model)
+    namespace = {}
+    items = []
+    for key in fields:
+        if key not in relations:
+            items.append(f'{key!r}: obj.{key}')
+            continue
+        relation = mapper.relationships[relations[key]]
+        nested = f'_{relation.key}'
+        namespace[nested] = serializer(relation.mapper.class_)
+        if relation.uselist:
+            items.append(f'{key!r}: [{nested}(item) for item in obj.{relation.key}]')
+        else:
+            items.append(f'{key!r}: {nested}(obj.{relation.key}) if obj.{relation.key} is not None else None')
+
+    source = 'def serialize(obj):\n    return {' + ', '.join(items) + '}\n'
+    exec(compile(source, f'<serializer {model.__name__}>', 'exec'), namespace)
+    return namespace['serialize']
+
+
+def serializer(model, fields=None):
+    # fields: claves a emitir (None = todas); los desconocidos ya los rechaza parse_fields
+    return compile_serializer(model, tuple(fields) if fields is not None else tuple(serializable_fields(model)))
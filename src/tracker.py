@@ -0,0 +1,229 @@
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+import click
+from flask import current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine.interfaces import ExecuteStyle
+from sqlalchemy.orm import Session
+from werkzeug.local import LocalProxy
+
+# Registro de las consultas SQL de una peticion, para detectar N+1 y rutas que
+# superan su presupuesto de consultas (@query_budget).
+#
+#   QUERY_TRACKER=off     desactivado (por defecto, produccion)
+#   QUERY_TRACKER=header  solo peticiones con la cabecera X-Query-Tracker: 1
+#   QUERY_TRACKER=on      todas las peticiones (staging)
+#   QUERY_BUDGET_MODE=warn  registra el problema y lo indica en cabeceras
+#   QUERY_BUDGET_MODE=fail  responde 500 con el detalle de las consultas; si
+#                           la ruta escribe, el commit se aborta antes de
+#                           guardar nada
+#
+# En pruebas: with track_queries() as tracker: client.get(...); tracker.check(3)
+
+logger = logging.getLogger(__name__)
+
+# Veces que puede repetirse la misma forma de consulta antes de considerarla N+1
+REPEAT_THRESHOLD = 3
+
+current_tracker = ContextVar('current_tracker', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def statement_shape(statement):
+    # Las consultas ya llegan parametrizadas; solo se agrupan las listas IN
+    # para que IN (?, ?) e IN (?, ?, ?) cuenten como la misma forma.
+    shape = re.sub(r'\s+', ' ', statement).strip()
+    return re.sub(r'\((?:\s*(?:\?|%s|:\w+|\$\d+)\s*,)+\s*(?:\?|%s|:\w+|\$\d+)\s*\)', '(?)', shape)
+
+
+class QueryTracker:
+    def __init__(self):
+        self.statements = []
+        # Sentencias de un mismo INSERT de varias filas que SQLAlchemy parte
+        # en lotes (insertmanyvalues): cuentan para el presupuesto pero no son
+        # un N+1
+        self.batched = set()
+
+    def record(self, statement, seconds, batch=False):
+        if batch:
+            self.batched.add(len(self.statements))
+        self.statements.append((statement, seconds))
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self, threshold=REPEAT_THRESHOLD):
+        # {forma: veces} de las consultas que se repiten threshold veces o mas
+        shapes = Counter(statement_shape(statement) for index, (statement, _) in enumerate(self.statements)
+                         if index not in self.batched)
+        return {shape: times for shape, times in shapes.items() if times >= threshold}
+
+    def problems(self, budget=None, threshold=REPEAT_THRESHOLD):
+        problems = []
+        if budget is not None and self.count > budget:
+            problems.append(f'{self.count} consultas, presupuesto {budget}')
+        for shape, times in self.repeated(threshold).items():
+            problems.append(f'posible N+1, {times} veces: {shape}')
+        return problems
+
+    def check(self, budget=None, threshold=REPEAT_THRESHOLD):
+        problems = self.problems(budget, threshold)
+        if problems:
+            raise QueryBudgetExceeded('; '.join(problems))
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'statements': [{'sql': statement, 'ms': round(seconds * 1000, 3)}
+                           for statement, seconds in self.statements],
+        }
+
+
+@contextmanager
+def track_queries():
+    tracker = QueryTracker()
+    token = current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        current_tracker.reset(token)
+
+
+def attach_tracker(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if current_tracker.get() is not None:
+            conn.info.setdefault('tracker_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        tracker = current_tracker.get()
+        if tracker is not None and conn.info.get('tracker_start'):
+            batch = context is not None and context.execute_style is ExecuteStyle.INSERTMANYVALUES
+            tracker.record(statement, time.perf_counter() - conn.info['tracker_start'].pop(), batch)
+
+
+def query_budget(limit):
+    # Maximo de consultas que puede ejecutar la ruta. Va justo debajo de
+    # @app.route para que el atributo quede en la funcion registrada.
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def set_query_budget(limit):
+    # Sustituye el presupuesto de la ruta en esta peticion, para rutas con dos
+    # caminos de coste distinto (p. ej. el alta masiva de POST /people)
+    if has_request_context():
+        g.query_budget = limit
+
+
+def current_budget():
+    if 'query_budget' in g:
+        return g.query_budget
+    return getattr(current_view(), 'query_budget', None)
+
+
+def check_before_commit(session):
+    # En modo fail una ruta que supera su presupuesto no llega a guardar: la
+    # excepcion aborta el commit y la ruta responde 500 tras el rollback
+    if not has_request_context() or 'query_tracker' not in g:
+        return
+    budgets = current_app.extensions.get('query_budgets')
+    if budgets is None or not budgets.fail:
+        return
+    problems = g.query_tracker.problems(current_budget())
+    if problems:
+        raise QueryBudgetExceeded('; '.join(problems))
+
+
+class QueryBudgets:
+    def __init__(self, app=None):
+        self.mode = 'off'
+        self.fail = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.mode = app.config.get('QUERY_TRACKER', os.getenv('QUERY_TRACKER', 'off')).lower()
+        self.fail = app.config.get('QUERY_BUDGET_MODE', os.getenv('QUERY_BUDGET_MODE', 'warn')).lower() == 'fail'
+        app.extensions['query_budgets'] = self
+        app.cli.command('check-query-budgets')(check_query_budgets)
+        if self.mode != 'off':
+            app.before_request(self._before_request)
+            app.after_request(self._after_request)
+            if self.fail and not event.contains(Session, 'before_commit', check_before_commit):
+                event.listen(Session, 'before_commit', check_before_commit)
+
+    def _before_request(self):
+        if self.mode == 'header' and request.headers.get('X-Query-Tracker') != '1':
+            return
+        g.query_tracker = QueryTracker()
+        g.query_tracker_token = current_tracker.set(g.query_tracker)
+
+    def _after_request(self, response):
+        tracker = g.pop('query_tracker', None)
+        if tracker is None:
+            return response
+        current_tracker.reset(g.pop('query_tracker_token'))
+
+        budget = current_budget()
+        problems = tracker.problems(budget)
+        response.headers['X-Query-Count'] = str(tracker.count)
+        if budget is not None:
+            response.headers['X-Query-Budget'] = str(budget)
+        if not problems:
+            return response
+
+        logger.warning('%s %s: %s', request.method, request.path, '; '.join(problems))
+        if not self.fail:
+            response.headers['X-Query-Problems'] = str(len(problems))
+            return response
+        failure = jsonify({'message': 'La ruta supera su presupuesto de consultas',
+                           'problems': problems, **tracker.to_dict()})
+        failure.status_code = 500
+        return failure
+
+
+def current_view():
+    if request.url_rule is None:
+        return None
+    return current_app.view_functions.get(request.url_rule.endpoint)
+
+
+@click.option('--id', 'entity_id', default=1, help='Id para las rutas con parametro')
+def check_query_budgets(entity_id):
+    """Recorre las rutas GET y comprueba su presupuesto de consultas."""
+    client = current_app.test_client()
+    failures = 0
+    for rule in sorted(current_app.url_map.iter_rules(), key=lambda r: r.rule):
+        if 'GET' not in rule.methods or rule.endpoint == 'static' or rule.rule.startswith('/admin'):
+            continue
+        view = current_app.view_functions[rule.endpoint]
+        budget = getattr(view, 'query_budget', None)
+        path = rule.build({arg: entity_id for arg in rule.arguments})[1]
+        with track_queries() as tracker:
+            status = client.get(path).status_code
+        problems = tracker.problems(budget)
+        if budget is None:
+            problems.append('sin @query_budget')
+        failures += bool(problems)
+        click.echo(f"{'FALLA' if problems else 'ok':5} {path} [{status}] {tracker.count}/{budget}")
+        for problem in problems:
+            click.echo(f'      {problem}')
+    if failures:
+        raise SystemExit(1)
+
+
+# QueryBudgets de la app actual
+query_budgets = LocalProxy(lambda: current_app.extensions['query_budgets'])
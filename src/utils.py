@@ -1,4 +1,8 @@
-from flask import jsonify, url_for
+import base64
+import itertools
+import json
+from flask import Response, current_app, jsonify, stream_with_context, url_for
+from sqlalchemy import Select, and_, select, tuple_, union_all
 
 class APIException(Exception):
     status_code = 400
@@ -15,6 +19,160 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def parse_int_arg(args, name, default=None, minimum=None, maximum=None):
+    value = args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise APIException(f"El parámetro '{name}' debe ser un entero", status_code=400)
+    if minimum is not None and value < minimum:
+        raise APIException(f"El parámetro '{name}' debe ser mayor o igual a {minimum}", status_code=400)
+    if maximum is not None and value > maximum:
+        value = maximum
+    return value
+
+def encode_cursor(cursor):
+    # Con ?sort= el cursor es (valor, id); se envia como token opaco
+    value = json.dumps(list(cursor), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(value).decode().rstrip('=')
+
+def decode_cursor(token, size=2):
+    # El ultimo elemento del cursor es siempre un id entero
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        cursor = json.loads(raw)
+        if not isinstance(cursor, list) or len(cursor) != size:
+            raise ValueError(cursor)
+        return (*cursor[:-1], int(cursor[-1]))
+    except (ValueError, TypeError):
+        raise APIException("El parámetro 'after' no es un cursor válido", status_code=400)
+
+def parse_page_args(args, sort=None):
+    # ?limit=&after=<id>; el limite se recorta a MAX_PAGE_SIZE
+    limit = parse_int_arg(args, 'limit', DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+    if sort is None:
+        after = parse_int_arg(args, 'after', minimum=0)
+    else:
+        after = decode_cursor(args['after']) if args.get('after') else None
+    return limit, after
+
+def seek_after(sort, column, value, last_id):
+    # Condicion de busqueda tras el cursor (valor, id). El id desempata en el
+    # mismo sentido que <sort>, asi la comparacion por tuplas recorre el indice
+    # de <sort> como un rango. Con valor None ya se esta en la fase de los NULL.
+    sort_column, descending = sort
+    if value is None:
+        return and_(sort_column.is_(None), column < last_id if descending else column > last_id)
+    if descending:
+        return tuple_(sort_column, column) < tuple_(value, last_id)
+    return tuple_(sort_column, column) > tuple_(value, last_id)
+
+def keyset_query(query, column, limit, after=None, sort=None):
+    # Paginacion por clave (seek): WHERE id > :after ORDER BY id LIMIT :limit + 1.
+    # Pedimos una fila extra para saber si existe una pagina siguiente.
+    # Con sort=(columna, descendente) el cursor es la tupla (valor, id).
+    # Sirve tanto para Model.query como para select() (modo async).
+    if sort is None:
+        if after is not None:
+            query = query.filter(column > after)
+        return query.order_by(column).limit(limit + 1)
+
+    # Las filas con <sort> NULL van al final y se paginan aparte por id: un OR
+    # con "IS NULL" en la misma condicion impide usar el indice. Mientras queden
+    # valores no nulos se piden las dos fases en una sola consulta y la pagina
+    # se completa con los NULL cuando se acaban los demas.
+    sort_column, descending = sort
+    direction = (lambda c: c.desc()) if descending else (lambda c: c.asc())
+    nulls = query.filter(sort_column.is_(None))
+    if after is not None and after[0] is None:
+        return nulls.filter(seek_after(sort, column, *after)).order_by(direction(column)).limit(limit + 1)
+
+    ranked = query.filter(sort_column.isnot(None))
+    if after is not None:
+        ranked = ranked.filter(seek_after(sort, column, *after))
+    ranked = ranked.order_by(direction(sort_column), direction(column)).limit(limit + 1)
+    nulls = nulls.order_by(direction(column)).limit(limit + 1)
+    # Cada fase en su subconsulta: SQLite no admite LIMIT en las ramas de un UNION
+    pages = union_all(*(select(*phase.subquery().c) for phase in (ranked, nulls))).subquery()
+    value, last_id = pages.c[sort_column.key], pages.c[column.key]
+    combined = select(*pages.c) if isinstance(query, Select) else query.session.query(*pages.c)
+    return combined.order_by(value.is_(None), direction(value), direction(last_id)).limit(limit + 1)
+
+def keyset_result(rows, column, limit, sort=None):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = getattr(rows[-1], column.key)
+        if sort is not None:
+            next_cursor = (getattr(rows[-1], sort[0].key), next_cursor)
+    return rows, next_cursor
+
+def keyset_page(query, column, limit, after=None, sort=None):
+    rows = keyset_query(query, column, limit, after, sort).all()
+    return keyset_result(rows, column, limit, sort)
+
+def parse_fields(args, allowed):
+    # ?fields=id,name -> ['id', 'name'] (None si no se pidio proyeccion)
+    raw = args.get('fields')
+    if not raw:
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise APIException(f"Campos desconocidos: {', '.join(unknown)}", status_code=400)
+    return fields
+
+def project_columns(model, fields, extra=()):
+    # Con ?fields= se seleccionan solo esas columnas en SQL (mas el id y las
+    # columnas extra que necesita el cursor) y se emiten filas sin crear
+    # entidades del ORM. Devuelve None si no se pidio proyeccion.
+    if fields is None:
+        return None
+    columns = [model.id] + [getattr(model, f) for f in fields if f != 'id']
+    columns += [c for c in extra if c.key not in fields and c.key != 'id']
+    return columns
+
+STREAM_BATCH_SIZE = 1000
+
+def wants_stream(args):
+    return args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+def iter_keyset_batches(query, column, batch_size=STREAM_BATCH_SIZE, sort=None):
+    # Recorre toda la tabla en lotes de batch_size usando keyset_page,
+    # sin mantener mas de un lote en memoria.
+    after = None
+    while True:
+        rows, after = keyset_page(query, column, batch_size, after, sort)
+        if rows:
+            yield rows
+        if after is None:
+            return
+
+def stream_json_array(batches, serialize=None, encode=None):
+    # Devuelve None si no hay filas para que el endpoint decida el 404
+    # antes de empezar a enviar el cuerpo. encode (fila -> texto JSON) evita
+    # pasar por un diccionario, p. ej. con un RowEncoder.
+    first = next(batches, None)
+    if first is None:
+        return None
+
+    def generate():
+        dumps = current_app.json.dumps
+        encode_row = encode or (lambda row: dumps(serialize(row)))
+        yield '['
+        separator = ''
+        for rows in itertools.chain([first], batches):
+            yield separator + ','.join([encode_row(row) for row in rows])
+            separator = ','
+        yield ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
@@ -0,0 +1,36 @@
+from sqlalchemy import text
+
+from app import create_app
+from models import db
+
+PERSON = {'name': 'Luke', 'mass': '77', 'hair_color': 'blond', 'skin_color': 'fair', 'eye_color': 'blue',
+          'birth_year': '19BBY', 'gender': 'male', 'height': '172'}
+VEHICLE = {'name': 'Sand Crawler', 'model': 'Digger Crawler', 'vehicle_class': 'wheeled', 'manufacturer': 'Corellia',
+           'cost_in_credits': 150000, 'length': 36.8, 'crew': '46', 'passengers': '30', 'max_atmosphering_speed': '30',
+           'cargo_capacity': '50000', 'consumables': '2 months', 'films': ['A New Hope'], 'pilots': []}
+
+
+def test_bulk_create_rejects_non_scalar_values(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "bulk.db"}',
+        'APP_COMPONENTS': 'api',
+    })
+    with app.app_context():
+        db.create_all()
+        # La tabla de busqueda la crea la migracion 5a0c7e93d218, no create_all
+        db.session.execute(text("CREATE VIRTUAL TABLE catalog_search USING fts5("
+                                "kind UNINDEXED, entity_id UNINDEXED, name, body)"))
+        db.session.commit()
+    client = app.test_client()
+
+    items = [dict(PERSON, name=None), dict(PERSON, name=['x']), PERSON, dict(PERSON, name='Leia', mass={'kg': 49})]
+    response = client.post('/people', json=items)
+    assert response.status_code == 207
+    results = response.get_json()['results']
+    assert [result['index'] for result in results if result['status'] == 400] == [0, 1, 3]
+    assert results[2]['status'] == 201
+    assert 'mass' in results[3]['message']
+
+    # films y pilots son listas: se aceptan como listas y no como escalares
+    response = client.post('/vehicles', json=[VEHICLE, dict(VEHICLE, name='Otro', films='A New Hope')])
+    assert [result['status'] for result in response.get_json()['results']] == [201, 400]
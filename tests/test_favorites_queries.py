@@ -0,0 +1,54 @@
+import pytest
+
+from app import create_app
+from models import db, Favorito, Personajes, Planetas, Usuario
+from tracker import track_queries
+
+FAVORITES_ROUTES = ['/favorites', '/users', '/users/favorites']
+
+
+def seed_favorites(count):
+    usuario = Usuario(nombre='Luke', apellido='Skywalker', email='luke@example.com', password='x')
+    db.session.add(usuario)
+    for i in range(count):
+        personaje = Personajes(name=f'Personaje {i}', mass='77', hair_color='blond', skin_color='fair',
+                               eye_color='blue', birth_year='19BBY', gender='male', height='172')
+        planeta = Planetas(name=f'Planeta {i}', diameter='10465', rotation_period='23', orbital_period='304',
+                           gravity='1', population='200000', climate='arid', terrain='desert', surface_water='1')
+        db.session.add_all([personaje, planeta])
+        db.session.add(Favorito(usuario=usuario, personajes=personaje))
+        db.session.add(Favorito(usuario=usuario, planetas=planeta))
+    db.session.commit()
+
+
+@pytest.fixture
+def make_client(tmp_path):
+    def make(favorites):
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / f"favorites_{favorites}.db"}',
+            'APP_COMPONENTS': 'api',
+        })
+        with app.app_context():
+            db.create_all()
+            seed_favorites(favorites)
+        return app.test_client()
+    return make
+
+
+def count_queries(client):
+    counts = {}
+    for route in FAVORITES_ROUTES:
+        with track_queries() as tracker:
+            response = client.get(route)
+        assert response.status_code == 200, route
+        counts[route] = tracker.count
+    return counts
+
+
+def test_favorites_query_count_does_not_grow(make_client):
+    # Los favoritos y sus entidades se cargan con joins/selectin: el numero de
+    # consultas no depende de cuantos favoritos haya
+    few = count_queries(make_client(1))
+    many = count_queries(make_client(50))
+    assert few == many
+    assert sum(many.values()) == 4